@@ -0,0 +1,125 @@
+import numpy as np
+
+""" Optimal assignment of tasks to robots based on the bids of all robots for all tasks
+"""
+
+
+def solve_assignment(cost_matrix):
+    """ Solves the (rectangular) assignment problem with the Hungarian algorithm
+
+    Args:
+        cost_matrix (np.ndarray): cost of assigning row i to column j
+
+    Returns:
+        list: (row, column) pairs that minimize the total cost. Each row and each column is assigned at most once
+    """
+    cost_matrix = np.asarray(cost_matrix, dtype=float)
+    if cost_matrix.size == 0:
+        return list()
+
+    transposed = cost_matrix.shape[0] > cost_matrix.shape[1]
+    if transposed:
+        cost_matrix = cost_matrix.T
+
+    n_rows, n_columns = cost_matrix.shape
+    # Potentials of rows and columns, and row assigned to each column. Column 0 is a dummy column
+    u = np.zeros(n_rows + 1)
+    v = np.zeros(n_columns + 1)
+    assigned_row = np.zeros(n_columns + 1, dtype=int)
+    way = np.zeros(n_columns + 1, dtype=int)
+
+    for row in range(1, n_rows + 1):
+        assigned_row[0] = row
+        column = 0
+        min_reduced_cost = np.full(n_columns + 1, np.inf)
+        used = np.zeros(n_columns + 1, dtype=bool)
+
+        while assigned_row[column] != 0:
+            used[column] = True
+            current_row = assigned_row[column]
+
+            free = ~used
+            free[0] = False
+            reduced_cost = np.full(n_columns + 1, np.inf)
+            reduced_cost[1:] = cost_matrix[current_row - 1] - u[current_row] - v[1:]
+
+            improved = free & (reduced_cost < min_reduced_cost)
+            min_reduced_cost[improved] = reduced_cost[improved]
+            way[improved] = column
+
+            candidates = np.where(free, min_reduced_cost, np.inf)
+            next_column = int(np.argmin(candidates))
+            delta = candidates[next_column]
+
+            u[assigned_row[used]] += delta
+            v[used] -= delta
+            min_reduced_cost[free] -= delta
+
+            column = next_column
+
+        while column != 0:
+            previous_column = way[column]
+            assigned_row[column] = assigned_row[previous_column]
+            column = previous_column
+
+    assignment = list()
+    for column in range(1, n_columns + 1):
+        if assigned_row[column]:
+            pair = (assigned_row[column] - 1, column - 1)
+            assignment.append(pair[::-1] if transposed else pair)
+
+    return sorted(assignment)
+
+
+def get_cost_matrix(bids, robot_ids, task_ids):
+    """ Returns a robots x tasks matrix with the cost of each bid, np.inf if the robot did not bid for the task.
+
+    Bids are compared by risk and then by objective, so the risk is replaced by its rank among all bids and
+    weighted so that a lower risk is never outweighed by the objectives of the rest of the assignment
+    """
+    cost_matrix = np.full((len(robot_ids), len(task_ids)), np.inf)
+    if not bids:
+        return cost_matrix
+
+    risks = sorted({bid.metrics.risk for bid in bids})
+    objectives = [bid.metrics.objective for bid in bids]
+    risk_weight = (max(objectives) - min(objectives) + 1) * min(len(robot_ids), len(task_ids))
+
+    robot_idx = {robot_id: i for i, robot_id in enumerate(robot_ids)}
+    task_idx = {task_id: j for j, task_id in enumerate(task_ids)}
+
+    for bid in bids:
+        cost = risks.index(bid.metrics.risk) * risk_weight + bid.metrics.objective
+        i, j = robot_idx[bid.robot_id], task_idx[bid.task_id]
+        cost_matrix[i, j] = min(cost, cost_matrix[i, j])
+
+    return cost_matrix
+
+
+def get_assignment(bids):
+    """ Returns the bids that minimize the total cost when each robot is assigned at most one task
+    and each task at most one robot
+    """
+    robot_ids = sorted({bid.robot_id for bid in bids})
+    task_ids = sorted({bid.task_id for bid in bids}, key=str)
+    cost_matrix = get_cost_matrix(bids, robot_ids, task_ids)
+
+    # Pairs without a bid get a cost higher than any assignment of bids, and are discarded afterwards
+    feasible = np.isfinite(cost_matrix)
+    if not feasible.any():
+        return list()
+    no_bid_cost = (np.abs(cost_matrix[feasible]).sum() + 1) * 2
+    solvable_matrix = np.where(feasible, cost_matrix, no_bid_cost)
+
+    bids_by_pair = dict()
+    for bid in bids:
+        pair = (bid.robot_id, bid.task_id)
+        if pair not in bids_by_pair or bid < bids_by_pair[pair]:
+            bids_by_pair[pair] = bid
+
+    assigned_bids = list()
+    for i, j in solve_assignment(solvable_matrix):
+        if feasible[i, j]:
+            assigned_bids.append(bids_by_pair[(robot_ids[i], task_ids[j])])
+
+    return assigned_bids
@@ -1,3 +1,5 @@
+import heapq
+import itertools
 import logging
 from datetime import timedelta
 
@@ -6,11 +8,17 @@ from mrs.allocation.round import Round
 from mrs.exceptions.allocation import AlternativeTimeSlot
 from mrs.exceptions.allocation import InvalidAllocation
 from mrs.exceptions.allocation import NoAllocation
+from mrs.exceptions.allocation import TaskNotFound
 from mrs.messages.bid import Bid, NoBid
 from mrs.messages.task_announcement import TaskAnnouncement
 from mrs.messages.task_contract import TaskContract, TaskContractAcknowledgment, TaskContractCancellation
+from mrs.performance.latency import RoundTracer
 from mrs.simulation.simulator import SimulatorInterface
+from mrs.timetable.writer import flushes_timetables
+from mrs.utils.event_loop import wakes_up_event_loop
 from mrs.utils.time import to_timestamp
+from mrs.utils.utils import get_checksum
+from pymodm.errors import DoesNotExist
 from ropod.structs.task import TaskStatus as TaskStatusConst
 from ropod.utils.timestamp import TimeStamp
 
@@ -28,19 +36,46 @@ class Auctioneer(SimulatorInterface):
         self.logger = logging.getLogger("mrs.auctioneer")
         self.api = kwargs.get('api')
         self.ccu_store = kwargs.get('ccu_store')
+        self.event_loop = kwargs.get('event_loop')
+        self.fleet_monitor = kwargs.get('fleet_monitor')
+        self.timetable_writer = kwargs.get('timetable_writer')
         self.robot_ids = list()
         self.timetable_manager = timetable_manager
 
         self.closure_window = timedelta(minutes=closure_window)
         self.alternative_timeslots = kwargs.get('alternative_timeslots', False)
+        # If True, robots bid for all tasks and tasks are assigned by solving an assignment problem
+        self.assignment = kwargs.get('allocation_method') == 'assignment'
+        # If True, a round awards up to one task per robot
+        self.multi_award = kwargs.get('multi_award', False) or self.assignment
+        # If True, the next round is announced while the winners of the previous round acknowledge their contracts
+        self.pipelined = kwargs.get('pipelined', False)
+        # If True, tasks that the robots already received are announced by id
+        self.delta_announcements = kwargs.get('delta_announcements', False)
+        # If not None, tasks are announced once their pickup starts within closure_window + horizon
+        horizon = kwargs.get('horizon')
+        self.horizon = timedelta(minutes=horizon) if horizon is not None else None
+        # If True, only robots whose timetables have capacity for the tasks are invited to the round
+        self.capacity_filter = kwargs.get('capacity_filter', False)
+        # If not None, only the n robots closest (in travel time) to the pickup of each task are invited to the round
+        self.n_nearest_bidders = kwargs.get('n_nearest_bidders')
+        self.round_tracer = RoundTracer(kwargs.get('latency_file'))
 
         self.logger.debug("Auctioneer started")
 
         self.tasks_to_allocate = dict()
+        # Tasks beyond the horizon, ordered by earliest pickup time
+        self.task_pool = list()
+        self._task_pool_counter = itertools.count()
         self.allocated_tasks = dict()
         self.allocations = list()
         self.allocation_times = list()
+        self.allocation_infos = dict()
+        self.bidding_times = dict()
         self.winning_bid = None
+        self.winning_bids = dict()
+        self.contract_rounds = dict()
+        self.announced_tasks = dict()
         self.changed_timetable = list()
         self.waiting_for_user_confirmation = list()
         self.round = Round(self.robot_ids, self.tasks_to_allocate)
@@ -48,10 +83,13 @@ class Auctioneer(SimulatorInterface):
     def configure(self, **kwargs):
         api = kwargs.get('api')
         ccu_store = kwargs.get('ccu_store')
+        planner = kwargs.get('planner')
         if api:
             self.api = api
         if ccu_store:
             self.ccu_store = ccu_store
+        if planner:
+            self.planner = planner
 
     def register_robot(self, robot_id):
         self.logger.debug("Registering robot %s", robot_id)
@@ -62,12 +100,20 @@ class Auctioneer(SimulatorInterface):
         self.timetable_manager.ztp = time_
 
     def run(self):
+        self.promote_tasks()
+
         if self.tasks_to_allocate and self.round.finished:
             self.announce_tasks()
 
-        if self.round.opened and self.round.time_to_close():
+        if self.multi_award and self.round.opened and self.round.time_to_close():
+            self.round_tracer.mark('closed', self.round.id)
+            self.process_round_results()
+
+        elif not self.multi_award and self.round.opened and self.round.time_to_close():
+            self.round_tracer.mark('closed', self.round.id)
             try:
                 round_result = self.round.get_result()
+                self.round_tracer.mark('elected', self.round.id)
                 self.process_round_result(round_result)
 
             except NoAllocation as e:
@@ -77,6 +123,12 @@ class Auctioneer(SimulatorInterface):
 
             except AlternativeTimeSlot as e:
                 self.process_alternative_timeslot(e)
+        else:
+            return
+
+        if self.pipelined and not self.round.finished:
+            # The winners acknowledge their contracts while the next round is open
+            self.finish_round()
 
     def process_round_result(self, round_result):
         self.winning_bid, self.tasks_to_allocate = round_result
@@ -88,9 +140,49 @@ class Auctioneer(SimulatorInterface):
             self.logger.warning("The earliest start time of task %s is invalid", self.winning_bid.task_id)
             self.finish_round()
 
+    def process_round_results(self):
+        """ Sends a task contract per winning bid of a multi-award round.
+        The round finishes once all contracts have been acknowledged or cancelled
+        """
+        try:
+            winning_bids, self.tasks_to_allocate = self.round.get_results()
+        except NoAllocation as e:
+            self.logger.warning("No allocation made in round %s ", e.round_id)
+            self.tasks_to_allocate = e.tasks_to_allocate
+            self.finish_round()
+            return
+
+        self.round_tracer.mark('elected', self.round.id)
+        # Valid winners of this round. In pipelined mode, winning_bids also holds contracts of previous rounds
+        winners = list()
+        for bid in winning_bids:
+            if bid.alternative_start_time:
+                self.accept_alternative_timeslot(bid)
+
+            elif bid.earliest_start_time and not self.is_valid_time(bid.earliest_start_time.to_datetime()):
+                self.logger.warning("The earliest start time of task %s is invalid", bid.task_id)
+                continue
+
+            self.winning_bids[bid.task_id] = bid
+            winners.append(bid)
+
+        if not winners:
+            self.finish_round()
+            return
+
+        for bid in winners:
+            self.send_task_contract(bid.task_id, bid.robot_id)
+
     def process_alternative_timeslot(self, exception):
         bid = exception.bid
         self.tasks_to_allocate = exception.tasks_to_allocate
+        self.accept_alternative_timeslot(bid)
+        self.winning_bid = bid
+        self.send_task_contract(bid.task_id, bid.robot_id)
+
+    def accept_alternative_timeslot(self, bid):
+        """ Accepts the alternative start time of a winning bid, both in single and in multi-award rounds
+        """
         alternative_allocation = (bid.task_id, [bid.robot_id], bid.alternative_start_time)
 
         self.logger.debug("Alternative timeslot for task %s: robot %s, alternative start time: %s ", bid.task_id,
@@ -100,57 +192,111 @@ class Auctioneer(SimulatorInterface):
 
         # TODO: Prompt the user to accept the alternative timeslot
         # For now, accept always
-        self.winning_bid = bid
-        self.send_task_contract(bid.task_id, bid.robot_id)
 
-    def process_allocation(self):
-        task = self.tasks_to_allocate.pop(self.winning_bid.task_id)
+    def process_allocation(self, winning_bid):
+        task = self.tasks_to_allocate.pop(winning_bid.task_id)
         try:
-            self.timetable_manager.update_timetable(self.winning_bid.robot_id,
-                                                    self.winning_bid.get_allocation_info(),
+            self.timetable_manager.update_timetable(winning_bid.robot_id,
+                                                    winning_bid.get_allocation_info(),
                                                     task)
         except InvalidAllocation as e:
             self.logger.warning("The allocation of task %s to robot %s is inconsistent. Aborting allocation."
                                 "Task %s will be included in next allocation round", e.task_id, e.robot_id, e.task_id)
-            self.undo_allocation(self.winning_bid.get_allocation_info())
+            self.undo_allocation(winning_bid, winning_bid.get_allocation_info())
             self.tasks_to_allocate[task.task_id] = task
             return
 
+        contract_round = self.get_contract_round(winning_bid.task_id)
+        self.round_tracer.mark('timetable_updated', contract_round.id, winning_bid.task_id)
         self.allocated_tasks[task.task_id] = task
 
-        allocation = (self.winning_bid.task_id, [self.winning_bid.robot_id])
+        allocation = (winning_bid.task_id, [winning_bid.robot_id])
         self.logger.debug("Allocation: %s", allocation)
         self.logger.debug("Tasks to allocate %s", [task_id for task_id, task in self.tasks_to_allocate.items()])
 
         self.logger.debug("Updating task status to ALLOCATED")
 
         self.allocations.append(allocation)
-        self.allocation_times.append(self.round.time_to_allocate)
-        self.finish_round()
-
-    def undo_allocation(self, allocation_info):
-        self.logger.warning("Undoing allocation of round %s", self.round.id)
-        self.send_task_contract_cancellation(self.winning_bid.task_id,
-                                             self.winning_bid.robot_id,
+        self.allocation_times.append(contract_round.time_to_allocate)
+        self.allocation_infos[winning_bid.task_id] = winning_bid.get_allocation_info()
+        self.bidding_times[winning_bid.task_id] = contract_round.get_bidding_time()
+
+    def undo_allocation(self, winning_bid, allocation_info):
+        self.logger.warning("Undoing allocation of task %s in round %s", winning_bid.task_id,
+                            self.get_contract_round(winning_bid.task_id).id)
+        self.send_task_contract_cancellation(winning_bid.task_id,
+                                             winning_bid.robot_id,
                                              allocation_info.prev_version_next_task)
-        self.finish_round()
+
+    def get_winning_bid(self, task_id):
+        if task_id in self.winning_bids or self.multi_award:
+            return self.winning_bids.get(task_id)
+        return self.winning_bid
+
+    def get_contract_round(self, task_id):
+        """ Returns the round in which the contract of task_id was offered """
+        return self.contract_rounds.get(task_id, self.round)
+
+    def conclude_contract(self, task_id):
+        """ Finishes the round once the contracts of all winning bids have been concluded.
+        In pipelined mode, the round was finished when the winners were elected
+        """
+        self.winning_bids.pop(task_id, None)
+        contract_round = self.contract_rounds.pop(task_id, self.round)
+        self.round_tracer.discard(contract_round.id, task_id)
+        if not self.pipelined and not self.winning_bids:
+            self.finish_round()
 
     def allocate(self, tasks):
         if isinstance(tasks, list):
             self.logger.debug("Auctioneer received a list of tasks")
             for task in tasks:
-                self.tasks_to_allocate[task.task_id] = task
+                self.add_task(task)
         else:
             self.logger.debug("Auctioneer received one task")
-            self.tasks_to_allocate[tasks.task_id] = tasks
+            self.add_task(tasks)
         self.logger.debug("Tasks to allocate %s", {task_id for (task_id, task) in self.tasks_to_allocate.items()})
+        self.logger.debug("Tasks in the task pool %s", len(self.task_pool))
+
+        if self.event_loop:
+            self.event_loop.notify()
+
+    def add_task(self, task):
+        if self.horizon is None:
+            self.tasks_to_allocate[task.task_id] = task
+        else:
+            heapq.heappush(self.task_pool, (task.pickup_constraint.earliest_time, next(self._task_pool_counter), task))
+
+    def promote_tasks(self):
+        """ Moves the tasks whose pickup starts within closure_window + horizon from the task pool
+        to the tasks to allocate
+        """
+        if not self.task_pool:
+            return
+
+        look_ahead = self.closure_window + self.horizon
+        horizon_end = self.get_current_time() + look_ahead
+        while self.task_pool and self.task_pool[0][0] <= horizon_end:
+            _, _, task = heapq.heappop(self.task_pool)
+            self.logger.debug("Task %s is within the horizon", task.task_id)
+            self.tasks_to_allocate[task.task_id] = task
+
+        if self.task_pool and self.event_loop:
+            self.event_loop.schedule(self.task_pool[0][0] - look_ahead)
 
     def finish_round(self):
         self.logger.debug("Finishing round %s", self.round.id)
         self.round.finish()
+        self.round_tracer.discard(self.round.id)
 
     def announce_tasks(self):
-        tasks = list(self.tasks_to_allocate.values())
+        # Tasks and robots with pending contracts (only in pipelined mode) are not part of the round
+        pending_robot_ids = {bid.robot_id for bid in self.winning_bids.values()}
+        tasks = [task for task_id, task in self.tasks_to_allocate.items() if task_id not in self.winning_bids]
+        robot_ids = [robot_id for robot_id in self.robot_ids if robot_id not in pending_robot_ids]
+        if not tasks or not robot_ids:
+            return
+
         earliest_task = Task.get_earliest_task(tasks)
         closure_time = earliest_task.pickup_constraint.earliest_time - self.closure_window
 
@@ -165,21 +311,39 @@ class Auctioneer(SimulatorInterface):
             self.tasks_to_allocate.pop(earliest_task.task_id)
             return
 
-        self.changed_timetable.clear()
+        # With alternative timeslots, robots can bid for tasks that do not fit their timetables
+        if self.capacity_filter and not self.alternative_timeslots:
+            robot_ids = self.timetable_manager.get_robots_with_capacity(robot_ids, tasks)
+            if not robot_ids:
+                self.logger.debug("No robot has capacity for tasks %s", [task.task_id for task in tasks])
+                return
+
+        if self.n_nearest_bidders:
+            robot_ids = self.get_nearest_robots(robot_ids, tasks)
+
+        self.changed_timetable[:] = [robot_id for robot_id in self.changed_timetable
+                                     if robot_id in pending_robot_ids]
         for task in tasks:
             if not task.hard_constraints:
                 self.update_soft_constraints(task)
 
-        self.round = Round(self.robot_ids,
+        self.round = Round(robot_ids,
                            self.tasks_to_allocate,
                            n_tasks=len(tasks),
                            closure_time=closure_time,
                            alternative_timeslots=self.alternative_timeslots,
+                           assignment=self.assignment,
                            simulator=self.simulator)
 
         earliest_admissible_time = TimeStamp()
         earliest_admissible_time.timestamp = self.get_current_time() + timedelta(minutes=1)
-        task_announcement = TaskAnnouncement(tasks, self.round.id, self.timetable_manager.ztp, earliest_admissible_time)
+        cached_task_ids = self.get_cached_task_ids(tasks, robot_ids) if self.delta_announcements else list()
+        task_announcement = TaskAnnouncement([task for task in tasks if task.task_id not in cached_task_ids],
+                                             self.round.id,
+                                             self.timetable_manager.ztp,
+                                             earliest_admissible_time,
+                                             robot_ids,
+                                             cached_task_ids)
 
         self.logger.debug("Starting round: %s", self.round.id)
         self.logger.debug("Number of tasks to allocate: %s", len(tasks))
@@ -190,6 +354,97 @@ class Auctioneer(SimulatorInterface):
 
         self.round.start()
         self.api.publish(msg, groups=['TASK-ALLOCATION'])
+        self.round_tracer.mark('announced', self.round.id)
+
+        if self.event_loop:
+            self.event_loop.schedule(closure_time)
+
+    def get_nearest_robots(self, robot_ids, tasks):
+        """ Returns the robots in robot_ids that are among the n_nearest_bidders closest robots
+        to the pickup location of at least one of the tasks.
+        Robots whose location is unknown are always invited
+        """
+        planner = getattr(self, 'planner', None)
+        # The planner is usually a TravelEstimator, which wraps the planner of the map
+        if getattr(planner, 'planner', planner) is None:
+            self.logger.warning("No planner configured. Inviting all robots")
+            return robot_ids
+
+        locations = dict()
+        nearest_robot_ids = set()
+        for robot_id in robot_ids:
+            location = self.get_robot_location(robot_id)
+            if location is None:
+                self.logger.warning("The location of robot %s is unknown. Inviting it", robot_id)
+                nearest_robot_ids.add(robot_id)
+            else:
+                locations[robot_id] = location
+
+        for task in tasks:
+            travel_times = {robot_id: self.get_travel_time(location, task.request.pickup_location)
+                            for robot_id, location in locations.items()}
+            nearest_robot_ids.update(heapq.nsmallest(self.n_nearest_bidders, locations,
+                                                     key=lambda robot_id: (travel_times[robot_id], robot_id)))
+
+        self.logger.debug("Nearest robots: %s", nearest_robot_ids)
+        return [robot_id for robot_id in robot_ids if robot_id in nearest_robot_ids]
+
+    def get_robot_location(self, robot_id):
+        """ Returns the delivery location of the last task in the timetable of the robot
+        or, if its timetable is empty, the location of the robot (None if its pose is unknown)
+        """
+        timetable = self.timetable_manager.get_timetable(robot_id)
+        n_tasks = len(timetable.get_tasks())
+        if n_tasks:
+            try:
+                return timetable.get_task(n_tasks).request.delivery_location
+            except (DoesNotExist, TaskNotFound):
+                self.logger.warning("Last task of robot %s not found, using its pose", robot_id)
+
+        if self.fleet_monitor is None or robot_id not in self.fleet_monitor.robots:
+            return
+        pose = self.fleet_monitor.get_robot_pose(robot_id)
+        if pose is None or pose.x is None or pose.y is None:
+            return
+        return self.planner.get_node(pose.x, pose.y)
+
+    def get_travel_time(self, source, destination):
+        path = self.planner.get_path(source, destination)
+        mean, variance = self.planner.get_estimated_duration(path)
+        return mean
+
+    def get_cached_task_ids(self, tasks, robot_ids):
+        """ Returns the ids of the tasks that all robot_ids received, unchanged, in a previous announcement.
+        Only the tasks in the current announcement are remembered
+        """
+        cached_task_ids = list()
+        announced_tasks = dict()
+
+        for task in tasks:
+            task_dict = task.to_dict()
+            task_dict.update(request=task.request.to_dict())
+            checksum = get_checksum(task_dict)
+            prev_checksum, prev_robot_ids = self.announced_tasks.get(task.task_id, (None, set()))
+
+            if checksum == prev_checksum and prev_robot_ids.issuperset(robot_ids):
+                cached_task_ids.append(task.task_id)
+                announced_tasks[task.task_id] = (checksum, prev_robot_ids)
+            elif checksum == prev_checksum:
+                announced_tasks[task.task_id] = (checksum, prev_robot_ids | set(robot_ids))
+            else:
+                announced_tasks[task.task_id] = (checksum, set(robot_ids))
+
+        self.announced_tasks = announced_tasks
+        return cached_task_ids
+
+    def forget_announced_task(self, task_id, robot_id):
+        """ Removes robot_id from the robots that received the task, so that the next announcement
+        carries the whole task. Called when the robot does not bid for the task, e.g.,
+        because the task was announced by id and was no longer in the robot's task cache
+        """
+        if task_id in self.announced_tasks:
+            checksum, robot_ids = self.announced_tasks[task_id]
+            self.announced_tasks[task_id] = (checksum, robot_ids - {robot_id})
 
     def update_soft_constraints(self, task):
         pickup_time_window = task.pickup_constraint.latest_time - task.pickup_constraint.earliest_time
@@ -198,29 +453,46 @@ class Auctioneer(SimulatorInterface):
         latest_pickup_time = earliest_pickup_time + pickup_time_window
         task.update_pickup_constraint(earliest_pickup_time, latest_pickup_time)
 
+    @wakes_up_event_loop
     def bid_cb(self, msg):
         payload = msg['payload']
-        self.round.process_bid(payload, Bid)
+        if self.round.process_bid(payload, Bid):
+            self.round_tracer.mark_bid(self.round.id)
 
+    @wakes_up_event_loop
     def no_bid_cb(self, msg):
         payload = msg['payload']
-        self.round.process_bid(payload, NoBid)
+        no_bid = self.round.process_bid(payload, NoBid)
+        if no_bid:
+            self.round_tracer.mark_bid(self.round.id)
+            self.forget_announced_task(no_bid.task_id, no_bid.robot_id)
 
+    @wakes_up_event_loop
+    @flushes_timetables
     def task_contract_acknowledgement_cb(self, msg):
         payload = msg['payload']
         ack = TaskContractAcknowledgment.from_payload(payload)
+        winning_bid = self.get_winning_bid(ack.task_id)
+
+        if winning_bid is None:
+            self.logger.warning("Task %s was not awarded in round %s", ack.task_id, self.round.id)
+            return
+
+        self.round_tracer.mark('ack_received', self.get_contract_round(ack.task_id).id, ack.task_id)
 
         if ack.accept and ack.robot_id not in self.changed_timetable:
             self.logger.debug("Concluding allocation of task %s", ack.task_id)
-            self.winning_bid.set_allocation_info(ack.allocation_info)
-            self.process_allocation()
+            winning_bid.set_allocation_info(ack.allocation_info)
+            self.process_allocation(winning_bid)
+            self.conclude_contract(ack.task_id)
 
         elif ack.accept and ack.robot_id in self.changed_timetable:
-            self.undo_allocation(ack.allocation_info)
+            self.undo_allocation(winning_bid, ack.allocation_info)
+            self.reject_contract(winning_bid)
 
         else:
-            self.logger.warning("Round %s has to be repeated", self.round.id)
-            self.finish_round()
+            self.logger.warning("Robot %s rejected the contract of task %s", ack.robot_id, ack.task_id)
+            self.reject_contract(winning_bid)
 
     def send_task_contract_cancellation(self, task_id, robot_id, prev_version_next_task):
         task_contract_cancellation = TaskContractCancellation(task_id, robot_id, prev_version_next_task)
@@ -229,14 +501,56 @@ class Auctioneer(SimulatorInterface):
         self.api.publish(msg, groups=['TASK-ALLOCATION'])
 
     def send_task_contract(self, task_id, robot_id):
+        self.round.award(task_id, robot_id)
+        self.contract_rounds[task_id] = self.round
+        if self.pipelined:
+            self.winning_bids[task_id] = self.get_winning_bid(task_id)
         # Send TaskContract only if the timetable of robot_id has not changed since the round opened
         if robot_id not in self.changed_timetable:
             task_contract = TaskContract(task_id, robot_id)
             msg = self.api.create_message(task_contract)
             self.api.publish(msg, groups=['TASK-ALLOCATION'])
+            self.round_tracer.mark('contract_sent', self.round.id, task_id)
         else:
-            self.logger.warning("Round %s has to be repeated", self.round.id)
-            self.finish_round()
+            self.logger.warning("The timetable of robot %s changed. Its bid for task %s is no longer valid",
+                                robot_id, task_id)
+            self.reject_contract(self.get_winning_bid(task_id))
+
+    def reject_contract(self, winning_bid):
+        """ Offers the contract to the next-best valid bid of the round (which can be for another task).
+        If there is none, the task is re-announced in the next round
+        """
+        contract_round = self.get_contract_round(winning_bid.task_id)
+        contract_round.reject(winning_bid.task_id)
+        self.winning_bids.pop(winning_bid.task_id, None)
+
+        if self.pipelined:
+            # The other robots of the round may be bidding in the next round, so their bids are no longer valid
+            runner_up = None
+        else:
+            runner_up = self.round.get_runner_up(excluded_robot_ids=self.changed_timetable)
+        while runner_up and runner_up.earliest_start_time and \
+                not self.is_valid_time(runner_up.earliest_start_time.to_datetime()):
+            self.logger.debug("The earliest start time of task %s is invalid", runner_up.task_id)
+            runner_up = self.round.get_runner_up(excluded_robot_ids=self.changed_timetable)
+
+        if runner_up is None:
+            self.logger.warning("No valid bid left in round %s. Task %s has to be re-announced in the next round",
+                                self.round.id, winning_bid.task_id)
+            self.conclude_contract(winning_bid.task_id)
+            return
+
+        # The contract of the rejected task is over, the runner-up gets a contract of its own
+        self.contract_rounds.pop(winning_bid.task_id, None)
+        self.round_tracer.discard(contract_round.id, winning_bid.task_id)
+
+        self.logger.debug("Offering contract of task %s to runner-up robot %s", runner_up.task_id,
+                          runner_up.robot_id)
+        if self.multi_award:
+            self.winning_bids[runner_up.task_id] = runner_up
+        else:
+            self.winning_bid = runner_up
+        self.send_task_contract(runner_up.task_id, runner_up.robot_id)
 
     def get_task_schedule(self, task_id, robot_id):
         """ Returns a dict
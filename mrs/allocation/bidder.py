@@ -1,5 +1,9 @@
 import copy
 import logging
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from fmlib.models.robot import Robot
 from fmlib.models.tasks import InterTimepointConstraint
@@ -8,17 +12,47 @@ from pymodm.errors import DoesNotExist
 from ropod.structs.task import TaskStatus as TaskStatusConst
 from stn.exceptions.stp import NoSTPSolution
 
+from mrs.allocation.bidding_context import BiddingContext
 from mrs.allocation.bidding_rule import bidding_rule_factory
+from mrs.allocation.task_cache import TaskCache
 from mrs.exceptions.allocation import TaskNotFound
 from mrs.messages.bid import NoBid, AllocationInfo
-from mrs.messages.task_announcement import TaskAnnouncement
+from mrs.messages.task_announcement import TaskAnnouncement, task_to_dict, task_from_dict
 from mrs.messages.task_contract import TaskContract, TaskContractAcknowledgment, TaskContractCancellation
+from mrs.timetable.timetable import Timetable
+from mrs.timetable.writer import flushes_timetables
+from mrs.utils.timing import PhaseTimer
+from mrs.utils.utils import get_checksum
 
 """ Implements a variation of the the TeSSI algorithm using the bidding_rule
 specified in the config file
 """
 
 
+def _evaluate_insertions(snapshot, jobs):
+    """ Evaluates insertion points of a bidding round in a worker process of the bidder's pool
+
+    Args:
+        snapshot (bytes): pickled snapshot of the bidder (see Bidder.get_bidding_snapshot)
+        jobs (list): (task index, insertion point) tuples
+
+    Returns:
+        list: (task index, insertion point, bid or None) per job
+        dict: time (in ms) spent in each phase, None if timing is disabled
+    """
+    worker = BiddingWorker(pickle.loads(snapshot))
+    results = list()
+    for task_idx, insertion_point in jobs:
+        bid = worker.compute_insertion_bid(worker.tasks[task_idx], worker.round_id, insertion_point,
+                                           worker.earliest_admissible_time)
+        if bid is not None:
+            # The bidder sets the stn and the dispatchable graph of the bids it sends
+            bid.set_stn(None)
+            bid.set_dispatchable_graph(None)
+        results.append((task_idx, insertion_point, bid))
+    return results, worker.timer.summary()
+
+
 class Bidder:
 
     def __init__(self, robot_id, timetable, bidding_rule, auctioneer_name, **kwargs):
@@ -34,6 +68,14 @@ class Bidder:
             kwargs:
                 api (API): object that provides middleware functionality
                 robot_store (robot_store): interface to interact with the db
+                n_workers (int): number of worker processes used to evaluate the insertion points of the tasks
+                                 with hard constraints. Bids are computed sequentially if n_workers <= 1
+                timing (bool): if True, the time spent in each phase of the bid computation
+                               is sent along with the bids
+                allocation_method (str): name of the allocation method. With 'assignment', the bidder
+                                         sends its best bid for each task instead of only the smallest bid
+                task_cache_size (int): maximum number of announced tasks kept in the task cache
+                timetable_writer (TimetableWriter): flushes the timetable after the callbacks that modify it
 
         """
         self.robot_id = robot_id
@@ -41,13 +83,25 @@ class Bidder:
         self.timetable.fetch()
         self.api = kwargs.get('api')
         self.robot_store = kwargs.get('robot_store')
+        self.timetable_writer = kwargs.get('timetable_writer')
+        self.n_workers = kwargs.get('n_workers', 1)
+        self.pool = None
+        self.assignment = kwargs.get('allocation_method') == 'assignment'
+        self.task_cache = TaskCache(kwargs.get('task_cache_size', 1000))
+        self.timer = PhaseTimer(kwargs.get('timing', False))
 
         self.logger = logging.getLogger('mrs.bidder.%s' % self.robot_id)
 
+        self.bidding_rule_name = bidding_rule
         self.bidding_rule = bidding_rule_factory.get_bidding_rule(bidding_rule, timetable)
+        self.bidding_rule.timer = self.timer
         self.auctioneer_name = auctioneer_name
         self.bid_placed = None
+        self.bids_placed = dict()
         self.changed_timetable = False
+        self.bidding_context = None
+        self.bid_cache = dict()
+        self.bid_cache_version = None
 
         self.logger.debug("Bidder initialized %s", self.robot_id)
 
@@ -61,15 +115,21 @@ class Bidder:
         task_announcement = TaskAnnouncement.from_payload(payload)
         self.logger.debug("Received TASK-ANNOUNCEMENT msg round %s with %s tasks", task_announcement.round_id,
                                                                                    len(task_announcement.tasks))
+        if task_announcement.robot_ids and self.robot_id not in task_announcement.robot_ids:
+            self.logger.debug("Robot %s is not invited to round %s", self.robot_id, task_announcement.round_id)
+            return
         self.logger.debug("Current stn: %s", self.timetable.stn)
         self.logger.debug("Current dispatchable graph: %s", self.timetable.dispatchable_graph)
         self.compute_bids(task_announcement)
 
+    @flushes_timetables
     def task_contract_cb(self, msg):
         payload = msg['payload']
         task_contract = TaskContract.from_payload(payload)
         if task_contract.robot_id == self.robot_id:
             self.logger.debug("Robot %s received TASK-CONTRACT", self.robot_id)
+            if self.assignment:
+                self.bid_placed = self.bids_placed.get(task_contract.task_id)
 
             if not self.changed_timetable:
                 self.allocate_to_robot(task_contract.task_id)
@@ -80,17 +140,58 @@ class Bidder:
                                     self.bid_placed)
                 self.send_contract_acknowledgement(task_contract, accept=False)
 
+    def get_announced_tasks(self, task_announcement):
+        """ Returns the tasks of the announcement, taking the tasks announced by id from the task cache,
+        and the ids of the announced tasks that are not in the cache nor in the db
+        """
+        tasks = list()
+        missing_task_ids = list()
+        for task in task_announcement.tasks:
+            self.task_cache.add(task)
+            tasks.append(task)
+
+        for task_id in task_announcement.cached_task_ids or list():
+            task = self.task_cache.get(task_id)
+            if task is None:
+                missing_task_ids.append(task_id)
+            else:
+                tasks.append(task)
+
+        return tasks, missing_task_ids
+
     def compute_bids(self, task_announcement):
         bids = list()
         no_bids = list()
         round_id = task_announcement.round_id
+        task_announcement.tasks, missing_task_ids = self.get_announced_tasks(task_announcement)
+        for task_id in missing_task_ids:
+            no_bids.append(NoBid(task_id, self.robot_id, round_id))
         earliest_admissible_time = task_announcement.earliest_admissible_time
         self.changed_timetable = False
         self.bid_placed = None
+        self.bids_placed = dict()
+        self.timer.reset()
+        start_time = time.perf_counter()
+
+        with self.timer.phase("bidding_context"):
+            self.bidding_context = BiddingContext(self.timetable, self.get_previous_location(1))
+
+        if self.bid_cache_version != self.timetable.version:
+            self.bid_cache.clear()
+            self.bid_cache_version = self.timetable.version
+
+        parallel_bids = dict()
+        if self.n_workers > 1:
+            parallel_bids = self.compute_bids_in_parallel([task for task in task_announcement.tasks
+                                                           if task.hard_constraints],
+                                                          round_id, earliest_admissible_time)
 
         for task in task_announcement.tasks:
-            self.logger.debug("Computing bid of task %s round %s", task.task_id, round_id)
-            best_bid = self.compute_bid(task, round_id, earliest_admissible_time)
+            if task.task_id in parallel_bids:
+                best_bid = parallel_bids.get(task.task_id)
+            else:
+                self.logger.debug("Computing bid of task %s round %s", task.task_id, round_id)
+                best_bid = self.compute_bid(task, round_id, earliest_admissible_time)
 
             if best_bid:
                 self.logger.debug("Best bid %s", best_bid)
@@ -100,9 +201,120 @@ class Bidder:
                 no_bid = NoBid(task.task_id, self.robot_id, round_id)
                 no_bids.append(no_bid)
 
-        smallest_bid = self.get_smallest_bid(bids)
+        if self.assignment:
+            for bid in bids:
+                self.set_dispatchable_graph(bid)
+            self.timer.add("total", time.perf_counter() - start_time)
+            self.send_all_bids(bids, no_bids)
+        else:
+            smallest_bid = self.get_smallest_bid(bids)
+            if smallest_bid:
+                self.set_dispatchable_graph(smallest_bid)
+            self.timer.add("total", time.perf_counter() - start_time)
+            self.send_bids(smallest_bid, no_bids)
+
+        self.bidding_context = None
+
+    def compute_bids_in_parallel(self, tasks, round_id, earliest_admissible_time):
+        """ Distributes the evaluation of the insertion points of the tasks among the worker processes.
+        The workers evaluate the insertions on a snapshot of the bidder (see get_bidding_snapshot),
+        the bidder selects the best bid of each task as in compute_bid.
+
+        Only tasks with hard constraints are evaluated in parallel, the pickup window of tasks with
+        soft constraints is updated in the task for each insertion point.
 
-        self.send_bids(smallest_bid, no_bids)
+        Returns:
+            dict: best bid (None if the task cannot be inserted) per task id.
+                  Empty if the workers failed, the bids are then computed sequentially
+        """
+        jobs = list()
+        bid_cache_keys = list()
+        travel_durations = dict()
+        for task_idx, task in enumerate(tasks):
+            insertion_points, bid_cache_key = self.get_bid_insertion_points(task)
+            bid_cache_keys.append(bid_cache_key)
+            for insertion_point in insertion_points:
+                if self.insert_in(insertion_point):
+                    jobs.append((task_idx, insertion_point))
+                    self.add_travel_durations(task, insertion_point, travel_durations)
+
+        task_bids = {task_idx: list() for task_idx in range(len(tasks))}
+        chunks = [jobs[k::self.n_workers] for k in range(self.n_workers) if jobs[k::self.n_workers]]
+        try:
+            if chunks:
+                self.logger.debug("Computing bids of round %s in %s workers", round_id, len(chunks))
+                snapshot = self.get_bidding_snapshot(tasks, round_id, earliest_admissible_time, travel_durations)
+            futures = [self.get_pool().submit(_evaluate_insertions, snapshot, chunk) for chunk in chunks]
+            for future in futures:
+                results, timing = future.result()
+                self.timer.merge(timing)
+                for task_idx, insertion_point, bid in results:
+                    task_bids[task_idx].append((insertion_point, bid))
+        except Exception:
+            self.logger.exception("The bidding workers failed, computing bids sequentially")
+            self.shutdown()
+            return dict()
+
+        best_bids = dict()
+        for task_idx, task in enumerate(tasks):
+            bids = sorted(task_bids[task_idx], key=lambda result: result[0])
+            best_bids[task.task_id] = self.select_bid(round_id, bids, bid_cache_keys[task_idx])
+        return best_bids
+
+    def get_bidding_snapshot(self, tasks, round_id, earliest_admissible_time, travel_durations):
+        """ Returns the pickled snapshot of the bidder that the worker processes evaluate insertions on.
+        It contains everything the evaluation reads from the db or the planner: the tasks in the timetable
+        (in the bidding context), the tasks to evaluate and the travel durations between their locations
+        """
+        return pickle.dumps({'robot_id': self.robot_id,
+                             'bidding_rule': self.bidding_rule_name,
+                             'timing': self.timer.enabled,
+                             'timetable': self.timetable.to_dict(),
+                             'bidding_context': self.bidding_context,
+                             'tasks': [task_to_dict(task) for task in tasks],
+                             'round_id': round_id,
+                             'earliest_admissible_time': earliest_admissible_time,
+                             'travel_durations': travel_durations})
+
+    def add_travel_durations(self, task, insertion_point, travel_durations):
+        """ Adds to travel_durations the (mean, variance) of the travel durations needed to insert
+        the task in the insertion point, by (source, destination)
+        """
+        previous_location = self.get_previous_location(insertion_point)
+        travels = list()
+        if previous_location is not None:
+            travels.append((task, previous_location))
+        try:
+            next_task = self.get_task(insertion_point)
+            travels.append((next_task, task.request.delivery_location))
+        except TaskNotFound:
+            pass
+
+        for destination_task, source in travels:
+            key = (source, destination_task.request.pickup_location)
+            if key not in travel_durations:
+                travel_duration = self.get_travel_duration(destination_task, source)
+                travel_durations[key] = (travel_duration.mean, travel_duration.variance)
+
+    def get_pool(self):
+        if self.pool is None:
+            # The workers are spawned, not forked, because the bidder runs in a multi-threaded process
+            self.pool = ProcessPoolExecutor(max_workers=self.n_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return self.pool
+
+    def shutdown(self):
+        """ Stops the worker processes, if any """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def set_dispatchable_graph(self, bid):
+        """ Sets to a bid computed by the worker processes the dispatchable graph of its stn """
+        allocation_info = bid.get_allocation_info()
+        if allocation_info.dispatchable_graph is None:
+            with self.timer.phase("solve"):
+                allocation_info.dispatchable_graph = self.timetable.compute_dispatchable_graph(allocation_info.stn)
 
     def send_bids(self, bid, no_bids):
         """ Sends the bid with the smallest cost
@@ -111,90 +323,247 @@ class Bidder:
         :param bid: bid with the smallest cost
         :param no_bids: list of no bids
         """
+        timing = self.timer.summary()
         if no_bids:
             for no_bid in no_bids:
+                no_bid.timing = timing
                 self.logger.debug("Sending no bid for task %s", no_bid.task_id)
                 self.send_bid(no_bid)
         if bid:
+            bid.timing = timing
             self.bid_placed = bid
             self.logger.debug("Placing bid %s ", self.bid_placed)
             self.send_bid(bid)
 
+    def send_all_bids(self, bids, no_bids):
+        """ Sends the best bid of each task, used when tasks are allocated by solving an assignment problem
+        Sends a no-bid per task that could not be accommodated in the stn
+
+        :param bids: best bid of each task
+        :param no_bids: list of no bids
+        """
+        timing = self.timer.summary()
+        for no_bid in no_bids:
+            no_bid.timing = timing
+            self.logger.debug("Sending no bid for task %s", no_bid.task_id)
+            self.send_bid(no_bid)
+
+        # Do not send bids for tasks that were dispatched after the bid computation
+        frozen_task_ids = self.get_frozen_task_ids()
+
+        for bid in bids:
+            if bid.task_id in frozen_task_ids:
+                continue
+            bid.timing = timing
+            self.bids_placed[bid.task_id] = bid
+            self.logger.debug("Placing bid %s ", bid)
+            self.send_bid(bid)
+
     def compute_bid(self, task, round_id, earliest_admissible_time):
-        best_bid = None
-        n_tasks = len(self.timetable.get_tasks())
+        insertion_points, bid_cache_key = self.get_bid_insertion_points(task)
+        bids = list()
 
         # Insert task in each possible insertion_point of the stn
-        # Add from insertion_point 1 onwards (insertion_point 0 is reserved for the ztp)
-        for insertion_point in range(1, n_tasks+2):
+        for insertion_point in insertion_points:
+            bid = self.compute_insertion_bid(task, round_id, insertion_point, earliest_admissible_time)
+            bids.append((insertion_point, bid))
 
-            prev_version_next_stn_task = None
+        return self.select_bid(round_id, bids, bid_cache_key)
 
-            self.logger.debug("Computing bid for task %s in insertion_point %s", task.task_id, insertion_point)
-            if not self.insert_in(insertion_point):
-                continue
+    def compute_insertion_bid(self, task, round_id, insertion_point, earliest_admissible_time):
+        self.logger.debug("Computing bid for task %s in insertion_point %s", task.task_id, insertion_point)
+        if not self.insert_in(insertion_point):
+            return
 
-            prev_location = self.get_previous_location(insertion_point)
-            travel_duration = self.get_travel_duration(task, prev_location)
-            if travel_duration is None:
-                self.logger.warning("There was a problem computing the estimated duration between %s and %s "
-                                    "Not computing bid for insertion point %s",
-                                    prev_location, task.request.pickup_location, insertion_point)
-                continue
+        allocation_info = self.get_allocation_info(task, insertion_point, earliest_admissible_time)
+        if allocation_info is None:
+            return
 
-            new_stn_task = self.timetable.to_stn_task(task, travel_duration, insertion_point, earliest_admissible_time)
+        return self.evaluate_insertion(task, round_id, allocation_info)
 
-            self.timetable.insert_task(new_stn_task, insertion_point)
-            allocation_info = AllocationInfo(insertion_point, new_stn_task)
+    def get_bid_insertion_points(self, task):
+        """ Returns the insertion points in which the bid of the task has to be computed and the key of the
+        task in the bid cache.
 
-            try:
-                # Update previous location and start constraints of next task (if any)
-                next_task = self.timetable.get_task(insertion_point+1)
-                prev_version_next_stn_task = self.timetable.get_stn_task(next_task.task_id)
+        The best bid among insertion points > 1 only depends on the timetable and on the task, so it is
+        reused while the timetable does not change. The bid of insertion point 1 is always computed because
+        it depends on the robot's location and on the earliest admissible time of the round.
+        """
+        insertion_points = self.get_insertion_points(task)
+        bid_cache_key = self.get_bid_cache_key(task)
 
-                prev_location = self.get_previous_location(insertion_point+1)
-                travel_duration = self.get_travel_duration(next_task, prev_location)
+        if bid_cache_key in self.bid_cache:
+            self.logger.debug("Reusing bid of task %s for insertion points > 1", task.task_id)
+            insertion_points = [insertion_point for insertion_point in insertion_points if insertion_point == 1]
 
-                if travel_duration is None:
-                    self.logger.warning("There was a problem computing the estimated duration between %s and %s "
-                                        "Not computing bid for insertion point %s",
-                                        prev_location, next_task.request.pickup_location, insertion_point)
-                    continue
+        return insertion_points, bid_cache_key
 
-                next_stn_task = self.timetable.update_stn_task(copy.deepcopy(prev_version_next_stn_task),
-                                                               travel_duration,
-                                                               insertion_point+1,
-                                                               earliest_admissible_time)
-                self.timetable.update_task(next_stn_task)
+    def get_bid_cache_key(self, task):
+        """ Returns the key of the task in the bid cache, or None if the bid of the task cannot be reused.
+        Tasks with soft constraints are not cached because their pickup window depends on the insertion point
+        """
+        if not task.hard_constraints:
+            return
 
-                allocation_info.update_next_task(next_stn_task, prev_version_next_stn_task)
+        task_hash = get_checksum(task_to_dict(task))
+        task_states = self.bidding_context.task_states if self.bidding_context else None
 
-            except TaskNotFound as e:
-                pass
+        return str(task.task_id), task_hash, self.timetable.version, task_states
 
-            stn = copy.deepcopy(self.timetable.stn)
+    def select_bid(self, round_id, bids, bid_cache_key):
+        """ Returns the best bid of a task and updates the bid cache
 
-            try:
-                bid = self.bidding_rule.compute_bid(stn, self.robot_id, round_id, task, allocation_info)
+        Args:
+            round_id (str): id of the current round
+            bids (list): (insertion_point, bid) tuples, ordered by insertion point
+            bid_cache_key (tuple): key of the task in the bid cache
+        """
+        first_bid = None
+        best_bid = None
+        for insertion_point, bid in bids:
+            if insertion_point == 1:
+                first_bid = bid
+            else:
+                best_bid = self.get_best_bid(best_bid, bid)
 
-                self.logger.debug("Bid: %s", bid)
+        if bid_cache_key in self.bid_cache:
+            best_bid = self.bid_cache.get(bid_cache_key)
+            if best_bid:
+                best_bid = copy.copy(best_bid)
+                best_bid.round_id = round_id
+        elif bid_cache_key is not None:
+            if best_bid:
+                self.set_stn_snapshot(best_bid)
+            self.bid_cache[bid_cache_key] = best_bid
+
+        best_bid = self.get_best_bid(first_bid, best_bid)
+
+        if best_bid and (best_bid is first_bid or bid_cache_key is None):
+            self.set_stn_snapshot(best_bid)
+
+        return best_bid
+
+    @staticmethod
+    def get_best_bid(best_bid, bid):
+        """ Returns bid if it is better than best_bid, and best_bid otherwise """
+        if bid is not None and (best_bid is None or
+                                bid < best_bid or
+                                (bid == best_bid and bid.task_id < best_bid.task_id)):
+            return bid
+        return best_bid
+
+    def get_allocation_info(self, task, insertion_point, earliest_admissible_time):
+        """ Returns the allocation info of inserting the task in the insertion_point, i.e.,
+        the stn task of the new task and, if there is a task after the insertion point,
+        the new version of its stn task
+        """
+        prev_location = self.get_previous_location(insertion_point)
+        if prev_location is None:
+            self.logger.warning("The location of the task previous to insertion point %s is unknown", insertion_point)
+            return
+
+        travel_duration = self.get_travel_duration(task, prev_location)
+        if travel_duration is None:
+            self.logger.warning("There was a problem computing the estimated duration between %s and %s "
+                                "Not computing bid for insertion point %s",
+                                prev_location, task.request.pickup_location, insertion_point)
+            return
+
+        new_stn_task = self.timetable.to_stn_task(task, travel_duration, insertion_point, earliest_admissible_time,
+                                                  bidding_context=self.bidding_context)
+        allocation_info = AllocationInfo(insertion_point, new_stn_task)
+
+        try:
+            # Update previous location and start constraints of next task (if any)
+            # The next task is the task currently in the insertion_point
+            next_task = self.get_task(insertion_point)
+            prev_version_next_stn_task = self.timetable.get_stn_task(next_task.task_id)
+
+            travel_duration = self.get_travel_duration(next_task, task.request.delivery_location)
+            if travel_duration is None:
+                self.logger.warning("There was a problem computing the estimated duration between %s and %s "
+                                    "Not computing bid for insertion point %s",
+                                    task.request.delivery_location, next_task.request.pickup_location,
+                                    insertion_point)
+                return
+
+            next_stn_task = self.timetable.update_stn_task(copy.deepcopy(prev_version_next_stn_task),
+                                                           travel_duration,
+                                                           insertion_point+1,
+                                                           earliest_admissible_time,
+                                                           bidding_context=self.bidding_context)
+
+            allocation_info.update_next_task(next_stn_task, prev_version_next_stn_task)
+
+        except TaskNotFound as e:
+            pass
+
+        return allocation_info
+
+    def evaluate_insertion(self, task, round_id, allocation_info):
+        """ Tentatively inserts the task in the timetable's stn and computes its bid.
+        The stn is restored before returning, so no copy of the stn is made.
+        The stp solvers do not modify the stn they solve (see mrs.tests.test_insertion)
 
-                if best_bid is None or \
-                        bid < best_bid or \
-                        (bid == best_bid and bid.task_id < best_bid.task_id):
-                    best_bid = bid
+        Returns:
+            Bid: bid for the insertion point or None if the stn is inconsistent with the task
+        """
+        insertion_point = allocation_info.insertion_point
+        bid = None
+
+        with self.timer.phase("stn_insertion"):
+            inserted = self.timetable.try_insertion(allocation_info.new_task, insertion_point,
+                                                    allocation_info.next_task)
+        if not inserted:
+            self.logger.debug("The bounds of task %s in insertion_point %s are inconsistent",
+                              task.task_id, insertion_point)
+        else:
+            try:
+                bid = self.bidding_rule.compute_bid(self.timetable.stn, self.robot_id, round_id, task,
+                                                    allocation_info)
+                # The bid cannot keep the stn, which is restored below.
+                # The bids that are sent get a snapshot of the stn (see set_stn_snapshot)
+                bid.set_stn(None)
+                self.logger.debug("Bid: %s", bid)
 
             except NoSTPSolution:
-                self.logger.debug("The STN is inconsistent with task %s in insertion_point %s", task.task_id, insertion_point)
+                self.logger.debug("The STN is inconsistent with task %s in insertion_point %s",
+                                  task.task_id, insertion_point)
 
-            self.timetable.stn.remove_task(insertion_point)
+        with self.timer.phase("stn_insertion"):
+            self.timetable.rollback_insertion(insertion_point, allocation_info.prev_version_next_task)
 
-            if prev_version_next_stn_task is not None:
-                self.timetable.stn.update_task(prev_version_next_stn_task)
+        return bid
 
-        return best_bid
+    def set_stn_snapshot(self, bid):
+        """ Sets to the bid a copy of the stn with the task inserted in the bid's insertion point.
+        Only the best bid of each task gets a copy of the stn
+        """
+        with self.timer.phase("stn_snapshot"):
+            bid.set_stn(self.timetable.get_snapshot(bid.get_allocation_info()))
+
+    def get_insertion_points(self, task):
+        """ Returns the insertion points where the task could be inserted.
+        Insertion_point 0 is reserved for the ztp, so insertion points start at 1
+        """
+        if self.bidding_context:
+            insertion_points = self.timetable.get_insertion_points(task,
+                                                                   self.bidding_context.insertion_bounds,
+                                                                   self.bidding_context.first_insertion_point)
+        else:
+            insertion_points = self.timetable.get_insertion_points(task)
+
+        self.logger.debug("Insertion points of task %s: %s", task.task_id, list(insertion_points))
+        return insertion_points
+
+    def get_task(self, position):
+        if self.bidding_context:
+            return self.bidding_context.get_task(position)
+        return self.timetable.get_task(position)
 
     def insert_in(self, insertion_point):
+        if self.bidding_context:
+            return self.bidding_context.insert_in(insertion_point)
         try:
             task = self.timetable.get_task(insertion_point)
             if task.status.status in [TaskStatusConst.DISPATCHED, TaskStatusConst.ONGOING]:
@@ -208,6 +577,9 @@ class Bidder:
             return False
 
     def get_previous_location(self, insertion_point):
+        if self.bidding_context:
+            return self.bidding_context.get_previous_location(insertion_point)
+
         if insertion_point == 1:
             try:
                 pose = Robot.get_robot(self.robot_id).position
@@ -236,8 +608,9 @@ class Bidder:
         """ Returns time (mean, variance) to go from previous_location to task.pickup_location
         """
         try:
-            path = self.planner.get_path(previous_location, task.request.pickup_location)
-            mean, variance = self.planner.get_estimated_duration(path)
+            with self.timer.phase("travel_estimation"):
+                path = self.planner.get_path(previous_location, task.request.pickup_location)
+                mean, variance = self.planner.get_estimated_duration(path)
         except AttributeError:
             self.logger.warning("No planner configured")
             mean = 1
@@ -246,6 +619,12 @@ class Bidder:
         self.logger.debug("Travel duration: %s", travel_duration)
         return travel_duration
 
+    @staticmethod
+    def get_frozen_task_ids():
+        """ Returns the ids of the tasks that are dispatched or ongoing """
+        return {task.task_id for status in [TaskStatusConst.DISPATCHED, TaskStatusConst.ONGOING]
+                for task in Task.get_tasks_by_status(status) if task}
+
     @staticmethod
     def get_smallest_bid(bids):
         """ Get the bid with the smallest cost among all bids.
@@ -255,17 +634,18 @@ class Bidder:
         """
         smallest_bid = None
 
+        # Do not consider bids for tasks that were dispatched after the bid computation
+        frozen_task_ids = Bidder.get_frozen_task_ids()
+
         for bid in bids:
-            # Do not consider bids for tasks that were dispatched after the bid computation
-            task = Task.get_task(bid.task_id)
-            if task.status.status in [TaskStatusConst.DISPATCHED, TaskStatusConst.ONGOING]:
+            if bid.task_id in frozen_task_ids:
                 continue
 
             if smallest_bid is None or\
                     bid < smallest_bid or\
                     (bid == smallest_bid and bid.task_id < smallest_bid.task_id):
 
-                smallest_bid = copy.deepcopy(bid)
+                smallest_bid = copy.copy(bid)
 
         return smallest_bid
 
@@ -285,6 +665,8 @@ class Bidder:
         self.timetable.stn = allocation_info.stn
         self.timetable.dispatchable_graph = allocation_info.dispatchable_graph
         self.timetable.store()
+        # The allocation is saved before it is acknowledged
+        self.timetable.flush()
 
         self.logger.debug("Robot %s allocated task %s", self.robot_id, task_id)
         self.logger.debug("STN: \n %s", self.timetable.stn)
@@ -297,6 +679,7 @@ class Bidder:
         task.update_status(TaskStatusConst.ALLOCATED)
         task.assign_robots([self.robot_id])
 
+    @flushes_timetables
     def task_contract_cancellation_cb(self, msg):
         payload = msg['payload']
         cancellation = TaskContractCancellation.from_payload(payload)
@@ -314,6 +697,8 @@ class Bidder:
 
     def send_contract_acknowledgement(self, task_contract, accept=True):
         allocation_info = self.bid_placed.get_allocation_info()
+        if accept:
+            allocation_info.attach_dispatchable_graph()
         task_contract_acknowledgement = TaskContractAcknowledgment(task_contract.task_id,
                                                                    task_contract.robot_id,
                                                                    allocation_info,
@@ -322,3 +707,30 @@ class Bidder:
 
         self.logger.debug("Robot %s sends task-contract-acknowledgement msg ", self.robot_id)
         self.api.publish(msg, groups=['TASK-ALLOCATION'])
+
+
+class BiddingWorker(Bidder):
+
+    def __init__(self, snapshot):
+        """ Evaluates insertion points in a worker process of the bidder's pool, on a snapshot of the bidder
+        (see Bidder.get_bidding_snapshot). It does not access the db nor the planner
+
+        Args:
+            snapshot (dict): unpickled snapshot of the bidder
+        """
+        self.robot_id = snapshot['robot_id']
+        self.timetable = Timetable.from_dict(snapshot['timetable'])
+        self.bidding_context = snapshot['bidding_context']
+        self.tasks = [task_from_dict(task_dict) for task_dict in snapshot['tasks']]
+        self.round_id = snapshot['round_id']
+        self.earliest_admissible_time = snapshot['earliest_admissible_time']
+        self.travel_durations = snapshot['travel_durations']
+        self.timer = PhaseTimer(snapshot['timing'])
+        self.logger = logging.getLogger('mrs.bidder.%s.worker' % self.robot_id)
+
+        self.bidding_rule = bidding_rule_factory.get_bidding_rule(snapshot['bidding_rule'], self.timetable)
+        self.bidding_rule.timer = self.timer
+
+    def get_travel_duration(self, task, previous_location):
+        mean, variance = self.travel_durations[(previous_location, task.request.pickup_location)]
+        return InterTimepointConstraint(mean=mean, variance=variance)
@@ -0,0 +1,94 @@
+from fmlib.models.tasks import TransportationTask as Task
+from pymodm.errors import DoesNotExist
+from ropod.structs.task import TaskStatus as TaskStatusConst
+
+from mrs.exceptions.allocation import TaskNotFound
+from mrs.messages.task_announcement import task_to_dict, task_from_dict
+
+
+class BiddingContext:
+
+    frozen_status = [TaskStatusConst.DISPATCHED, TaskStatusConst.ONGOING]
+
+    def __init__(self, timetable, robot_location):
+        """ Snapshot of the information the bidder reads from the db while computing bids.
+        It is built once per task announcement, so evaluating insertion points does not query the db
+
+        Args:
+            timetable (Timetable): timetable of the robot
+            robot_location (str): name of the node in the map where the robot is located
+
+        Attributes:
+            tasks (dict): task (Task) per position in the timetable, None if the task is not in the db
+            statuses (dict): task status per position
+            delivery_locations (dict): delivery location per position
+            task_states (tuple): (in db, frozen) per position
+            first_insertion_point (int): first insertion point that is not occupied by a frozen task
+            insertion_bounds (tuple): bounds used to discard infeasible insertion points
+                                      (see Timetable.get_insertion_bounds)
+        """
+        self.robot_location = robot_location
+        self.tasks = dict()
+        self.statuses = dict()
+        self.delivery_locations = dict()
+
+        self.n_tasks = len(timetable.get_tasks())
+        for position in range(1, self.n_tasks + 1):
+            task_id = timetable.stn.get_task_id(position)
+            try:
+                task = Task.get_task(task_id)
+                self.tasks[position] = task
+                self.statuses[position] = task.status.status
+                self.delivery_locations[position] = task.request.delivery_location
+            except DoesNotExist:
+                self.tasks[position] = None
+
+        self.task_states = tuple((self.tasks[position] is not None, self.is_frozen(position))
+                                 for position in range(1, self.n_tasks + 1))
+        self.insertion_bounds = timetable.get_insertion_bounds()
+
+        self.first_insertion_point = self.n_tasks + 1
+        for insertion_point in range(1, self.n_tasks + 1):
+            if self.insert_in(insertion_point):
+                self.first_insertion_point = insertion_point
+                break
+
+    def __getstate__(self):
+        # Tasks are pickled as dicts, so a worker process rebuilds them without querying the db
+        state = dict(self.__dict__)
+        state['tasks'] = {position: task_to_dict(task) if task is not None else None
+                          for position, task in self.tasks.items()}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tasks = {position: task_from_dict(task_dict) if task_dict is not None else None
+                      for position, task_dict in self.tasks.items()}
+
+    def get_task(self, position):
+        """ Returns the task in the given position, as Timetable.get_task
+        """
+        if position not in self.tasks:
+            raise TaskNotFound(position)
+        task = self.tasks.get(position)
+        if task is None:
+            raise DoesNotExist
+        return task
+
+    def is_frozen(self, position):
+        return self.statuses.get(position) in self.frozen_status
+
+    def insert_in(self, insertion_point):
+        """ A task can be inserted in the insertion_point if it is after the last task or if the task
+        currently in the insertion_point is in the db and has not been dispatched
+        """
+        if insertion_point > self.n_tasks:
+            return True
+        if self.tasks.get(insertion_point) is None:
+            return False
+        return not self.is_frozen(insertion_point)
+
+    def get_previous_location(self, insertion_point):
+        if insertion_point == 1:
+            return self.robot_location
+        return self.delivery_locations.get(insertion_point - 1)
@@ -1,7 +1,9 @@
+import logging
 import math
 from datetime import timedelta
 
 from mrs.messages.bid import Bid, Metrics
+from mrs.utils.timing import PhaseTimer
 from stn.exceptions.stp import NoSTPSolution
 
 
@@ -24,6 +26,8 @@ class BiddingRuleBase:
     def __init__(self, temporal_criterion, timetable):
         self.temporal_criterion = temporal_criterion
         self.timetable = timetable
+        self.timer = PhaseTimer()
+        self.logger = logging.getLogger('mrs.bidding.rule')
 
     def compute_metrics(self, dispatchable_graph, **kwargs):
         temporal_metric = dispatchable_graph.compute_temporal_metric(self.temporal_criterion)
@@ -31,11 +35,13 @@ class BiddingRuleBase:
 
     def compute_bid(self, stn, robot_id, round_id, task, allocation_info):
         try:
-            dispatchable_graph = self.timetable.compute_dispatchable_graph(stn)
-            metrics = self.compute_metrics(dispatchable_graph, allocation_info=allocation_info)
+            with self.timer.phase("solve"):
+                dispatchable_graph = self.timetable.compute_dispatchable_graph(stn)
+            with self.timer.phase("temporal_metric"):
+                metrics = self.compute_metrics(dispatchable_graph, allocation_info=allocation_info)
 
-            print("stn: ", stn)
-            print("dispatchable graph: ", dispatchable_graph)
+            self.logger.debug("stn: %s", stn)
+            self.logger.debug("dispatchable graph: %s", dispatchable_graph)
 
             if task.constraints.hard:
                 bid = Bid(task.task_id,
@@ -1,8 +1,12 @@
 import copy
+import functools
+import heapq
+import itertools
 import logging
 import time
 from datetime import datetime
 
+from mrs.allocation.assignment import get_assignment
 from mrs.exceptions.allocation import AlternativeTimeSlot
 from mrs.exceptions.allocation import NoAllocation
 from mrs.messages.bid import NoBid, BiddingRobot
@@ -23,13 +27,24 @@ class Round(SimulatorInterface):
         self.n_tasks = kwargs.get('n_tasks')
         self.closure_time = kwargs.get('closure_time')
         self.alternative_timeslots = kwargs.get('alternative_timeslots', False)
+        # If True, robots bid for all tasks and the winners are elected by solving an assignment problem
+        self.assignment = kwargs.get('assignment', False)
         self.id = generate_uuid()
 
         self.finished = True
         self.opened = False
         self.received_bids = dict()
         self.received_no_bids = dict()
+        self.bidding_times = dict()
         self.bidding_robots = {robot_id: BiddingRobot(robot_id) for robot_id in self.robot_ids}
+        self.n_finished_bidders = 0
+
+        # All bids received in the round, ranked by cost
+        self.bid_ledger = list()
+        self._bid_counter = itertools.count()
+        # Tasks whose contract has been offered and robots that have been offered a contract
+        self.awarded_task_ids = set()
+        self.awarded_robot_ids = set()
         self.start_time = datetime.now().timestamp()
         self.time_to_allocate = None
 
@@ -57,6 +72,7 @@ class Round(SimulatorInterface):
         self.opened = True
 
     def process_bid(self, payload, bid_cls):
+        """ Returns the bid if it was processed, None otherwise """
         bid = bid_cls.from_payload(payload)
         if not self.opened:
             self.logger.warning("No round bid opened. Not processing bid..")
@@ -74,8 +90,24 @@ class Round(SimulatorInterface):
             if bid.task_id not in self.received_bids or \
                     self.update_task_bid(bid, self.received_bids[bid.task_id]):
                 self.received_bids[bid.task_id] = bid
+            heapq.heappush(self.bid_ledger, (self.get_rank(bid), next(self._bid_counter), bid))
 
-        self.bidding_robots[bid.robot_id].update(bid)
+        if bid.timing:
+            self.bidding_times[bid.robot_id] = bid.timing
+
+        bidding_robot = self.bidding_robots[bid.robot_id]
+        finished_bidding = bidding_robot.placed_bid(self.n_tasks, self.assignment)
+        bidding_robot.update(bid)
+        if not finished_bidding and bidding_robot.placed_bid(self.n_tasks, self.assignment):
+            self.n_finished_bidders += 1
+
+        return bid
+
+    @staticmethod
+    def get_rank(bid):
+        """ Bids are ranked by cost, ties are broken by task id and then by robot id """
+        robot_id = int(bid.robot_id.split('_')[-1])
+        return bid.metrics.cost, str(bid.task_id), robot_id
 
     @staticmethod
     def update_task_bid(new_bid, old_bid):
@@ -92,14 +124,7 @@ class Round(SimulatorInterface):
         return False
 
     def all_robots_placed_bid(self):
-        bidding_robots = 0
-        for robot_id, bidding_robot in self.bidding_robots.items():
-            if bidding_robot.placed_bid(self.n_tasks):
-                bidding_robots += 1
-
-        if bidding_robots == len(self.robot_ids):
-            return True
-        return False
+        return self.n_finished_bidders >= len(self.robot_ids)
 
     def time_to_close(self):
         current_time = self.get_current_time()
@@ -139,6 +164,24 @@ class Round(SimulatorInterface):
         except NoAllocation as e:
             raise NoAllocation(e.round_id, e.tasks_to_allocate)
 
+    def get_results(self):
+        """ Returns the results of a multi-award round as a tuple
+
+        :return: round_results
+
+        winning_bids, tasks_to_allocate = round_results
+
+        winning_bids (list): winning bids, at most one per robot, ordered by cost
+        tasks_to_allocate (dict): tasks left to allocate
+
+        """
+        self.get_result_no_bids()
+        if self.assignment:
+            winning_bids = self.elect_assignment()
+        else:
+            winning_bids = self.elect_winners()
+        return winning_bids, self.tasks_to_allocate
+
     def finish(self):
         self.opened = False
         self.finished = True
@@ -167,13 +210,105 @@ class Round(SimulatorInterface):
             if lowest_bid is None \
                     or bid < lowest_bid \
                     or (bid == lowest_bid and bid.task_id < lowest_bid.task_id):
-                lowest_bid = copy.deepcopy(bid)
+                lowest_bid = bid
 
         if lowest_bid is None:
             raise NoAllocation(self.id, self.tasks_to_allocate)
 
-        return lowest_bid
+        return copy.copy(lowest_bid)
+
+    def elect_winners(self):
+        """ Elects up to one winner per robot, in global cost order.
+        Each robot bids for at most one task per round, so the winning bids do not conflict
+
+        :return: list of winning bids
+        """
+        winning_bids = list()
+        winning_robot_ids = set()
+
+        for bid in sorted(self.received_bids.values(), key=functools.cmp_to_key(self.compare_bids)):
+            if bid.robot_id not in winning_robot_ids:
+                winning_bids.append(copy.copy(bid))
+                winning_robot_ids.add(bid.robot_id)
+
+        if not winning_bids:
+            raise NoAllocation(self.id, self.tasks_to_allocate)
+
+        return winning_bids
+
+    def elect_assignment(self):
+        """ Elects the bids that minimize the total cost, assigning at most one task per robot
+
+        :return: list of winning bids, ordered by cost
+        """
+        bids = [entry[-1] for entry in self.bid_ledger]
+        winning_bids = [copy.copy(bid) for bid in get_assignment(bids)]
+
+        if not winning_bids:
+            raise NoAllocation(self.id, self.tasks_to_allocate)
+
+        return sorted(winning_bids, key=functools.cmp_to_key(self.compare_bids))
+
+    @staticmethod
+    def compare_bids(bid, other_bid):
+        if bid < other_bid or (bid == other_bid and bid.task_id < other_bid.task_id):
+            return -1
+        if other_bid < bid or (bid == other_bid and other_bid.task_id < bid.task_id):
+            return 1
+        return 0
+
+    def award(self, task_id, robot_id):
+        """ Registers that the contract of task_id has been offered to robot_id """
+        self.awarded_task_ids.add(task_id)
+        self.awarded_robot_ids.add(robot_id)
+
+    def reject(self, task_id):
+        """ Registers that the contract of task_id was rejected, so the task can be offered to another robot.
+        The robot that rejected it is not offered another contract in this round
+        """
+        self.awarded_task_ids.discard(task_id)
+
+    def get_runner_up(self, excluded_robot_ids=None):
+        """ Returns the best bid of the round that is still valid, i.e., its task has not been awarded and
+        is still to allocate, and its robot has not been offered a contract in this round and is not in
+        excluded_robot_ids. Returns None if there is no such bid.
+
+        Bids of robots that can no longer win are removed from the ledger
+        """
+        excluded_robot_ids = set(excluded_robot_ids or list()) | self.awarded_robot_ids
+        awarded_bids = list()
+        runner_up = None
+
+        while self.bid_ledger:
+            entry = heapq.heappop(self.bid_ledger)
+            bid = entry[-1]
+            if bid.robot_id in excluded_robot_ids or bid.task_id not in self.tasks_to_allocate \
+                    or bid.alternative_start_time:
+                continue
+            if bid.task_id in self.awarded_task_ids:
+                # The contract of the task could still be rejected
+                awarded_bids.append(entry)
+                continue
+            runner_up = copy.copy(bid)
+            break
+
+        for entry in awarded_bids:
+            heapq.heappush(self.bid_ledger, entry)
+
+        return runner_up
 
     def get_time_to_allocate(self):
         return self.time_to_allocate
 
+    def get_bidding_time(self):
+        """ Returns the time (in ms) spent in each phase of the bid computation,
+        the maximum among the robots that sent their timing, or None if no robot sent it
+        """
+        if not self.bidding_times:
+            return
+        bidding_time = dict()
+        for timing in self.bidding_times.values():
+            for phase, duration in timing.items():
+                bidding_time[phase] = max(duration, bidding_time.get(phase, 0))
+        return bidding_time
+
@@ -0,0 +1,47 @@
+import logging
+from collections import OrderedDict
+
+from fmlib.models.tasks import TransportationTask as Task
+from pymodm.errors import DoesNotExist
+
+
+class TaskCache:
+    def __init__(self, cache_size=1000):
+        """ Bounded (LRU) cache of the tasks decoded from task announcements.
+
+        Task announcements include the full task only the first time a task is announced to a robot
+        (or after the task changes), afterwards, they only include its id.
+
+        Args:
+            cache_size (int): maximum number of tasks in the cache
+        """
+        self.logger = logging.getLogger('mrs.task.cache')
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def add(self, task):
+        self._cache[task.task_id] = task
+        self._cache.move_to_end(task.task_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, task_id):
+        """ Returns the task with the given id. Tasks that are not in the cache are read from the db
+
+        Returns:
+            Task or None if the task is neither in the cache nor in the db
+        """
+        task = self._cache.get(task_id)
+        if task is not None:
+            self._cache.move_to_end(task_id)
+            return task
+
+        try:
+            task = Task.get_task(task_id)
+            self.add(task)
+            return task
+        except DoesNotExist:
+            self.logger.warning("Task %s is not in the cache nor in the db", task_id)
+
+    def clear(self):
+        self._cache.clear()
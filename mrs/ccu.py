@@ -1,6 +1,5 @@
 import argparse
 import logging.config
-import time
 
 from fmlib.models.actions import GoTo
 from fmlib.models.tasks import TaskPlan
@@ -19,12 +18,18 @@ from mrs.performance.tracker import PerformanceTracker
 from mrs.simulation.simulator import Simulator, SimulatorInterface
 from mrs.timetable.monitor import TimetableMonitor
 from mrs.timetable.timetable import TimetableManager
+from mrs.timetable.writer import TimetableWriter
+from mrs.utils.event_loop import EventLoop
+from mrs.utils.travel_estimator import TravelEstimator
 
 _component_modules = {
     'simulator': Simulator,
+    'travel_estimator': TravelEstimator,
+    'event_loop': EventLoop,
+    'timetable_writer': TimetableWriter,
     'timetable_manager': TimetableManager,
-    'auctioneer': Auctioneer,
     'fleet_monitor': FleetMonitor,
+    'auctioneer': Auctioneer,
     'dispatcher': Dispatcher,
     'delay_recovery': DelayRecovery,
     'timetable_monitor': TimetableMonitor,
@@ -48,6 +53,8 @@ class CCU:
         timetable_monitor (obj): Updates robots' timetables based on execution information and applies recovery methods
         simulator_interface(obj): Controls the simulation clock time
         performance_tracker(obj): Stores performance metrics in the ccu_store
+        event_loop(obj): Wakes up the CCU when a message is received or when a round closes or a task is due
+        timetable_writer(obj): Stores the timetables, at most once per iteration of the CCU loop if write_behind is set
         api(obj): Communication middleware API
         ccu_store(obj): Database to store ccu information
         logger(obj): Logger object
@@ -62,6 +69,8 @@ class CCU:
         self.timetable_monitor = components.get("timetable_monitor")
         self.simulator_interface = SimulatorInterface(components.get('simulator'))
         self.performance_tracker = components.get("performance_tracker")
+        self.event_loop = components.get("event_loop")
+        self.timetable_writer = components.get("timetable_writer")
 
         self.api = components.get('api')
         self.ccu_store = components.get('ccu_store')
@@ -150,18 +159,19 @@ class CCU:
             task.assign_robots(robot_ids)
             task_schedule = self.auctioneer.get_task_schedule(task_id, robot_ids[0])
             task.update_schedule(task_schedule)
-            self.update_allocation_metrics()
+            self.update_allocation_metrics(task_id)
 
             for robot_id in robot_ids:
                 self.dispatcher.send_d_graph_update(robot_id)
 
-    def update_allocation_metrics(self):
-        """ Updates last's allocation performance metrics
+    def update_allocation_metrics(self, task_id):
+        """ Updates the performance metrics of the allocation of task_id
         """
         allocation_time = self.auctioneer.allocation_times.pop(0)
-        allocation_info = self.auctioneer.winning_bid.get_allocation_info()
+        allocation_info = self.auctioneer.allocation_infos.pop(task_id)
+        bidding_time = self.auctioneer.bidding_times.pop(task_id, None)
         task = Task.get_task(allocation_info.new_task.task_id)
-        self.performance_tracker.update_allocation_metrics(task, allocation_time)
+        self.performance_tracker.update_allocation_metrics(task, allocation_time, bidding_time=bidding_time)
         if allocation_info.next_task:
             task = Task.get_task(allocation_info.next_task.task_id)
             self.performance_tracker.update_allocation_metrics(task, only_constraints=True)
@@ -177,11 +187,14 @@ class CCU:
                 self.timetable_monitor.run()
                 self.process_allocation()
                 self.performance_tracker.run()
+                self.timetable_writer.flush()
                 self.api.run()
-                time.sleep(0.5)
+                self.event_loop.wait()
         except (KeyboardInterrupt, SystemExit):
             self.api.shutdown()
+            self.timetable_writer.shutdown()
             self.simulator_interface.stop()
+            self.auctioneer.round_tracer.export()
             self.logger.info('CCU is shutting down')
 
     def shutdown(self):
@@ -212,8 +225,11 @@ if __name__ == '__main__':
     config = Configurator(config_params, component_modules=_component_modules)
     components_ = config.config_ccu()
 
+    travel_estimator = components_.get("travel_estimator")
+    travel_estimator.configure(planner=Planner(**config_params.get("planner")))
+
     kwargs = {
-        "planner": Planner(**config_params.get("planner")),
+        "planner": travel_estimator,
         "performance_tracker": components_.get("performance_tracker")
     }
 
@@ -12,17 +12,23 @@ from mrs.performance.tracker import PerformanceTracker
 from mrs.simulation.simulator import Simulator
 from mrs.timetable.timetable import Timetable, TimetableManager
 from mrs.timetable.monitor import TimetableMonitor
-from stn.stp import STP
+from mrs.timetable.stp import get_stp_solver
+from mrs.timetable.writer import TimetableWriter
+from mrs.utils.event_loop import EventLoop
+from mrs.utils.travel_estimator import TravelEstimator
 
 
 class MRTABuilder:
 
     _component_modules = {'simulator': Simulator,
+                          'travel_estimator': TravelEstimator,
+                          'event_loop': EventLoop,
+                          'timetable_writer': TimetableWriter,
                           'timetable': Timetable,
                           'timetable_manager': TimetableManager,
                           'delay_recovery': DelayRecovery,
-                          'auctioneer': Auctioneer,
                           'fleet_monitor': FleetMonitor,
+                          'auctioneer': Auctioneer,
                           'dispatcher': Dispatcher,
                           'bidder': Bidder,
                           'executor': Executor,
@@ -33,11 +39,14 @@ class MRTABuilder:
                           }
 
     _config_order = ['simulator',
+                     'travel_estimator',
+                     'event_loop',
+                     'timetable_writer',
                      'timetable',
                      'timetable_manager',
                      'delay_recovery',
-                     'auctioneer',
                      'fleet_monitor',
+                     'auctioneer',
                      'dispatcher',
                      'bidder',
                      'executor',
@@ -49,8 +58,10 @@ class MRTABuilder:
 
     """ Maps an allocation method to its stp_solver solver """
     _allocation_methods = {'tessi': 'fpc',
+                           'tessi-chain': 'chain',
                            'tessi-srea': 'srea',
                            'tessi-dsc': 'dsc',
+                           'assignment': 'fpc',
                            }
 
     def __init__(self, allocation_method, **kwargs):
@@ -80,7 +91,7 @@ class MRTABuilder:
         if not solver_name:
             self.logger.error("The given allocation method is not available")
             raise ValueError(allocation_method)
-        return STP(solver_name)
+        return get_stp_solver(solver_name)
 
     def configure_component(self, component_name, config, **kwargs):
         self.logger.debug("Creating %s", component_name)
@@ -3,12 +3,25 @@ import logging.config
 from fmlib.api import API
 from fmlib.config.builders import Store
 from mrs.config.builder import MRTABuilder
+from mrs.utils.loopback import LoopbackAPI
 
 
 class Configurator:
     def __init__(self, config_params, **kwargs):
-
+        """ Creates the components of the ccu, robot proxies and robots
+
+        Args:
+            config_params (dict): configuration parameters
+            kwargs:
+                component_modules (dict): components to create
+                api_bus (LoopbackBus): if given, components communicate through this in-process bus
+                                       instead of the middleware
+                store (obj): if given, store shared by all components (e.g. when they run in one process)
+                             instead of one store per component
+        """
         self._config_params = config_params
+        self._api_bus = kwargs.pop('api_bus', None)
+        self._store = kwargs.pop('store', None)
 
         self.logger = logging.getLogger('mrs')
         logger_config = self._config_params.get('logger')
@@ -42,9 +55,17 @@ class Configurator:
         elif robot_id and component_name == 'robot':
             api_config['zyre']['zyre_node']['node_name'] = robot_id
 
-        self._factory.register_component('api', API(**api_config))
+        if self._api_bus:
+            api = LoopbackAPI(self._api_bus, **api_config)
+        else:
+            api = API(**api_config)
+        self._factory.register_component('api', api)
 
     def register_store(self, component_name, **kwargs):
+        if self._store is not None:
+            self._factory.register_component(component_name + '_store', self._store)
+            return
+
         robot_id = kwargs.get("robot_id")
         store_config = self._config_params.get(component_name + '_store')
         if robot_id:
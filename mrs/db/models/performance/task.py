@@ -8,6 +8,9 @@ class TaskAllocationPerformance(EmbeddedMongoModel):
 
     time_to_allocate (float): Time taken to allocate the task
 
+    bidding_time (dict): Time (in ms) spent in each phase of the bid computation (maximum among the robots).
+                         Only recorded if the bidders are configured with timing: True
+
     n_previously_allocated_tasks (int): Number of task in the robot's STN before allocating this task
 
     timepoint constraints of d-graph after allocation:
@@ -20,6 +23,7 @@ class TaskAllocationPerformance(EmbeddedMongoModel):
 
     """
     time_to_allocate = fields.ListField()
+    bidding_time = fields.ListField(blank=True)
     n_previously_allocated_tasks = fields.ListField()
     start_time = fields.EmbeddedDocumentField(TimepointConstraint)
     pickup_time = fields.EmbeddedDocumentField(TimepointConstraint)
@@ -29,11 +33,14 @@ class TaskAllocationPerformance(EmbeddedMongoModel):
 
     def initialize(self):
         self.time_to_allocate = list()
+        self.bidding_time = list()
         self.n_previously_allocated_tasks = list()
 
     def update(self, **kwargs):
         if 'time_to_allocate' in kwargs:
             self.time_to_allocate.append(kwargs['time_to_allocate'])
+        if kwargs.get('bidding_time') is not None:
+            self.bidding_time.append(kwargs['bidding_time'])
         if 'n_previously_allocated_tasks' in kwargs:
             self.n_previously_allocated_tasks.append(kwargs['n_previously_allocated_tasks'])
         if 'start_time' in kwargs:
@@ -17,6 +17,46 @@ class TimetableQuerySet(QuerySet):
 
 TimetableManager = Manager.from_queryset(TimetableQuerySet)
 
+# Lists of the graph dicts (see STN.to_dict) that are stored as dicts, keyed by node id and by (source, target)
+_keyed_lists = {'nodes': lambda item: item['id'],
+                'links': lambda item: (item['source'], item['target']),
+                'edges': lambda item: (item['source'], item['target'])}
+
+
+def _to_key(item_id):
+    return '-'.join(str(id_) for id_ in item_id) if isinstance(item_id, tuple) else str(item_id)
+
+
+def to_keyed_graph(graph_dict):
+    """ Returns a copy of graph_dict whose nodes and links are dicts instead of lists,
+    so that a changed node or link can be updated in the db by its path, regardless of its position in the list
+    """
+    keyed_graph = dict(graph_dict)
+    for name, get_id in _keyed_lists.items():
+        items = graph_dict.get(name)
+        if isinstance(items, list):
+            keyed_items = {_to_key(get_id(item)): item for item in items}
+            if len(keyed_items) == len(items):
+                keyed_graph[name] = keyed_items
+    return keyed_graph
+
+
+def from_keyed_graph(graph_dict):
+    """ Inverse of to_keyed_graph. Graph dicts that are not keyed are returned as they are
+    """
+    graph_dict = dict(graph_dict)
+    for name, get_id in _keyed_lists.items():
+        items = graph_dict.get(name)
+        if isinstance(items, dict):
+            items = list(items.values())
+            try:
+                items.sort(key=get_id)
+            except TypeError:
+                # Ids that cannot be compared keep the order of the document
+                pass
+            graph_dict[name] = items
+    return graph_dict
+
 
 class Timetable(MongoModel):
     robot_id = fields.CharField(primary_key=True)
@@ -33,10 +73,42 @@ class Timetable(MongoModel):
         ignore_unknown_fields = True
 
     def save(self):
+        """ Returns False if the db could not be reached """
         try:
             super().save(cascade=True)
+            return True
         except ServerSelectionTimeoutError:
             logging.warning('Could not save models to MongoDB')
+            return False
+
+    @classmethod
+    def update_fields(cls, robot_id, set_fields, unset_fields):
+        """ Updates only the given fields of the timetable of robot_id
+
+        Args:
+            robot_id (str): id of the robot
+            set_fields (dict): new value of each changed field, by path (e.g. 'stn.nodes.3.data')
+            unset_fields (list): paths of the removed fields
+
+        Returns:
+            bool: False if the db could not be reached or has no timetable for robot_id
+        """
+        update = dict()
+        if set_fields:
+            update['$set'] = set_fields
+        if unset_fields:
+            update['$unset'] = {path: '' for path in unset_fields}
+        if not update:
+            return True
+        try:
+            result = cls._mongometa.collection.update_one({'_id': robot_id}, update)
+        except ServerSelectionTimeoutError:
+            logging.warning('Could not update models in MongoDB')
+            return False
+        if result.matched_count != 1:
+            logging.warning('The timetable of robot %s is not in MongoDB, it could not be updated', robot_id)
+            return False
+        return True
 
     @classmethod
     def from_payload(cls, payload):
@@ -1,9 +1,9 @@
-import copy
 import logging
 from datetime import timedelta
 
 from fmlib.models.actions import GoTo
 from mrs.simulation.simulator import SimulatorInterface
+from mrs.utils.utils import get_checksum
 from ropod.structs.task import TaskStatus as TaskStatusConst
 
 
@@ -21,6 +21,7 @@ class Dispatcher(SimulatorInterface):
             kwargs:
                 api (API): object that provides middleware functionality
                 robot_store (robot_store): interface to interact with the db
+                event_loop (EventLoop): woken up when the earliest allocated task of a robot enters the freeze window
         """
         simulator = kwargs.get('simulator')
         super().__init__(simulator)
@@ -28,6 +29,7 @@ class Dispatcher(SimulatorInterface):
         self.logger = logging.getLogger('mrs.dispatcher')
         self.api = kwargs.get('api')
         self.ccu_store = kwargs.get('ccu_store')
+        self.event_loop = kwargs.get('event_loop')
 
         self.timetable_manager = timetable_manager
         self.freeze_window = timedelta(minutes=freeze_window)
@@ -107,6 +109,8 @@ class Dispatcher(SimulatorInterface):
                     self.add_pre_task_action(task, robot_id)
                     self.send_d_graph_update(robot_id)
                     self.dispatch_task(task, robot_id)
+                elif self.event_loop:
+                    self.event_loop.schedule(start_time.to_datetime() - self.freeze_window)
 
     def dispatch_task(self, task, robot_id):
         """
@@ -123,11 +127,14 @@ class Dispatcher(SimulatorInterface):
 
     def send_d_graph_update(self, robot_id):
         timetable = self.timetable_manager.get_timetable(robot_id)
-        prev_d_graph_update = self.d_graph_updates.get(robot_id)
         d_graph_update = timetable.get_d_graph_update(robot_id, self.n_queued_tasks)
+        msg = self.api.create_message(d_graph_update)
 
-        if prev_d_graph_update != d_graph_update:
+        # The checksum of the last update sent to the robot is kept instead of a copy of its graphs
+        payload = msg['payload']
+        checksum = get_checksum({'stn': payload['stn'], 'dispatchable_graph': payload['dispatchable_graph']})
+
+        if self.d_graph_updates.get(robot_id) != checksum:
             self.logger.debug("Sending DGraphUpdate to %s", robot_id)
-            msg = self.api.create_message(d_graph_update)
             self.api.publish(msg, peer=robot_id)
-            self.d_graph_updates[robot_id] = copy.deepcopy(d_graph_update)
+            self.d_graph_updates[robot_id] = checksum
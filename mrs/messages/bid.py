@@ -1,6 +1,8 @@
 from stn.task import Task as STNTask
 
+from mrs.timetable.snapshot import STNSnapshot
 from mrs.utils.as_dict import AsDictMixin
+from mrs.utils.utils import get_checksum
 
 
 class Metrics(AsDictMixin):
@@ -35,10 +37,19 @@ class Metrics(AsDictMixin):
 
 class BidBase(AsDictMixin):
 
-    def __init__(self, task_id, robot_id, round_id):
+    def __init__(self, task_id, robot_id, round_id, **kwargs):
+        """
+        Args:
+            task_id (UUID): id of the task
+            robot_id (str): id of the robot
+            round_id (UUID): id of the round
+            kwargs:
+                timing (dict): time (in ms) the robot spent in each phase of the bid computation
+        """
         self.task_id = task_id
         self.robot_id = robot_id
         self.round_id = round_id
+        self.timing = kwargs.get("timing")
 
     @property
     def meta_model(self):
@@ -46,8 +57,8 @@ class BidBase(AsDictMixin):
 
 
 class NoBid(BidBase):
-    def __init__(self, task_id, robot_id, round_id):
-        super().__init__(task_id, robot_id, round_id)
+    def __init__(self, task_id, robot_id, round_id, **kwargs):
+        super().__init__(task_id, robot_id, round_id, **kwargs)
 
     def __str__(self):
         to_print = ""
@@ -65,7 +76,7 @@ class Bid(BidBase):
         self._allocation_info = None
         self.earliest_start_time = kwargs.get("earliest_start_time")
         self.alternative_start_time = kwargs.get("alternative_start_time")
-        super().__init__(task_id, robot_id, round_id)
+        super().__init__(task_id, robot_id, round_id, **kwargs)
 
     def __str__(self):
         to_print = ""
@@ -110,11 +121,25 @@ class Bid(BidBase):
 
 
 class AllocationInfo(AsDictMixin):
-    def __init__(self, insertion_point, new_task, next_task=None, prev_version_next_task=None):
+    def __init__(self, insertion_point, new_task, next_task=None, prev_version_next_task=None, **kwargs):
+        """ Information about the insertion of a task in a robot's timetable
+
+        Args:
+            insertion_point (int): position of the new task in the stn
+            new_task (STNTask): stn task of the new task
+            next_task (STNTask): new version of the stn task of the task after the insertion point
+            prev_version_next_task (STNTask): current version of the stn task of the task after the insertion point
+            kwargs:
+                stn_version (str): checksum of the robot's stn with the task inserted, from which
+                                   the dispatchable graph was computed
+                dispatchable_graph_dict (dict): dict representation of the dispatchable graph
+        """
         self.insertion_point = insertion_point
         self.new_task = new_task
         self.next_task = next_task
         self.prev_version_next_task = prev_version_next_task
+        self.stn_version = kwargs.get("stn_version")
+        self.dispatchable_graph_dict = kwargs.get("dispatchable_graph_dict")
         self._stn = None
         self._dispatchable_graph = None
 
@@ -124,6 +149,8 @@ class AllocationInfo(AsDictMixin):
 
     @property
     def stn(self):
+        if isinstance(self._stn, STNSnapshot):
+            return self._stn.materialize()
         return self._stn
 
     @stn.setter
@@ -138,6 +165,26 @@ class AllocationInfo(AsDictMixin):
     def dispatchable_graph(self, dispatchable_graph):
         self._dispatchable_graph = dispatchable_graph
 
+    def attach_dispatchable_graph(self):
+        """ Adds to the allocation info the dispatchable graph, so that it is sent along with it,
+        and the version of the stn it was computed against
+        """
+        if self.stn is None or self.dispatchable_graph is None:
+            return
+        self.stn_version = get_checksum(self.stn.to_dict())
+        self.dispatchable_graph_dict = self.dispatchable_graph.to_dict()
+
+    def get_attached_dispatchable_graph(self, stn):
+        """ Returns the attached dispatchable graph if it was computed against the given stn, i.e., if the
+        checksum of the stn in which the receiver inserted the task matches the one computed by the robot
+        over its own stn. Returns None otherwise
+        """
+        if self.dispatchable_graph_dict is None:
+            return
+        if self.stn_version != get_checksum(stn.to_dict()):
+            return
+        return stn.from_dict(self.dispatchable_graph_dict)
+
     @classmethod
     def to_attrs(cls, dict_repr):
         attrs = super().to_attrs(dict_repr)
@@ -170,7 +217,12 @@ class BiddingRobot:
         else:
             self.bids.append(bid)
 
-    def placed_bid(self, n_tasks):
+    def placed_bid(self, n_tasks, all_bids=False):
+        """ Returns True if the robot finished bidding. If all_bids is True, robots bid for all tasks,
+        otherwise, they only bid for the task with the smallest cost
+        """
+        if all_bids:
+            return len(self.bids) + len(self.no_bids) >= n_tasks
         if len(self.bids) == 1 or len(self.no_bids) == n_tasks:
             return True
         return False
@@ -1,13 +1,25 @@
 from fmlib.models.requests import TransportationRequest
 from fmlib.models.tasks import TransportationTask as Task, TransportationTaskConstraints as TaskConstraints
 from ropod.utils.timestamp import TimeStamp
-from ropod.utils.uuid import generate_uuid
+from ropod.utils.uuid import generate_uuid, from_str
 
 from mrs.utils.as_dict import AsDictMixin
 
 
+def task_to_dict(task):
+    """ Returns the dict representation of a task, including its request """
+    task_dict = task.to_dict()
+    task_dict.update(request=task.request.to_dict())
+    return task_dict
+
+
+def task_from_dict(task_dict):
+    """ Returns the task of a dict created with task_to_dict """
+    return Task.from_payload(task_dict, constraints=TaskConstraints, request=TransportationRequest)
+
+
 class TaskAnnouncement(AsDictMixin):
-    def __init__(self, tasks, round_id, ztp, earliest_admissible_time):
+    def __init__(self, tasks, round_id, ztp, earliest_admissible_time, robot_ids=None, cached_task_ids=None):
         """
         Constructor for the TaskAnnouncement object
 
@@ -16,8 +28,13 @@ class TaskAnnouncement(AsDictMixin):
              round_id (str): A string of the format UUID that identifies the round
              ztp (TimeStamp): Zero Time Point. Origin time to which task temporal information must be
                                         referenced to
+             robot_ids (list): Robots invited to bid. If None, all robots are invited
+             cached_task_ids (list): Ids of announced tasks that the robots already received in a previous
+                                     announcement. These tasks are not serialized
         """
         self.tasks = tasks
+        self.robot_ids = robot_ids
+        self.cached_task_ids = cached_task_ids
 
         if not round_id:
             self.round_id = generate_uuid()
@@ -31,9 +48,10 @@ class TaskAnnouncement(AsDictMixin):
         dict_repr = super().to_dict()
         tasks_dict = dict()
         for task in self.tasks:
-            tasks_dict[str(task.task_id)] = task.to_dict()
-            tasks_dict[str(task.task_id)].update(request=task.request.to_dict())
+            tasks_dict[str(task.task_id)] = task_to_dict(task)
         dict_repr.update(tasks=tasks_dict)
+        if self.cached_task_ids:
+            dict_repr.update(cached_task_ids=[str(task_id) for task_id in self.cached_task_ids])
         return dict_repr
 
     @classmethod
@@ -41,8 +59,10 @@ class TaskAnnouncement(AsDictMixin):
         attrs = super().to_attrs(dict_repr)
         tasks = list()
         for task_id, task_dict in attrs.get("tasks").items():
-            tasks.append(Task.from_payload(task_dict, constraints=TaskConstraints, request=TransportationRequest))
+            tasks.append(task_from_dict(task_dict))
         attrs.update(tasks=tasks)
+        if attrs.get("cached_task_ids"):
+            attrs.update(cached_task_ids=[from_str(task_id) for task_id in attrs.get("cached_task_ids")])
         return attrs
 
     @property
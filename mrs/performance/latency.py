@@ -0,0 +1,147 @@
+import json
+import logging
+import math
+import threading
+import time
+
+""" Latency of the phases of the auction rounds, recorded in memory while the system runs
+"""
+
+ROUND_PHASES = ['announced', 'first_bid', 'last_bid', 'closed', 'elected', 'contract_sent', 'ack_received',
+                'timetable_updated']
+
+
+class LatencyHistogram:
+    def __init__(self, precision=0.01, min_value=0.001):
+        """ Histogram of latencies with logarithmic buckets (HDR-style),
+        i.e., the relative error of the recorded values is bounded by precision, regardless of their magnitude
+
+        Args:
+            precision (float): relative width of the buckets
+            min_value (float): values (in ms) below min_value are recorded in the first bucket
+        """
+        self.precision = precision
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.buckets = dict()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """ Records a latency (in ms) """
+        bucket = math.floor(math.log(max(value, self.min_value) / self.min_value) / self._log_base)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def get_bucket_value(self, bucket):
+        """ Returns the upper bound of the bucket """
+        return self.min_value * math.exp((bucket + 1) * self._log_base)
+
+    def get_percentile(self, percentile):
+        """ Returns the latency (in ms) below which percentile % of the recorded latencies fall """
+        if not self.count:
+            return
+        threshold = math.ceil(self.count * percentile / 100)
+        cumulative_count = 0
+        for bucket in sorted(self.buckets):
+            cumulative_count += self.buckets[bucket]
+            if cumulative_count >= threshold:
+                return min(self.get_bucket_value(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        if self.count:
+            return self.total / self.count
+
+    def to_dict(self):
+        histogram_dict = dict()
+        histogram_dict['count'] = self.count
+        histogram_dict['min'] = self.min
+        histogram_dict['max'] = self.max
+        histogram_dict['mean'] = self.mean
+        for percentile in [50, 90, 99, 99.9]:
+            histogram_dict['p%s' % percentile] = self.get_percentile(percentile)
+        histogram_dict['buckets'] = {round(self.get_bucket_value(bucket), 3): count
+                                     for bucket, count in sorted(self.buckets.items())}
+        return histogram_dict
+
+
+class RoundTracer:
+    def __init__(self, latency_file=None):
+        """ Timestamps the phases of the auction rounds and records, per phase, the latency (in ms)
+        since the previous phase of the same round
+
+        The phases after the election (contract sent, acknowledgement received and timetable updated)
+        are traced per task, a multi-award round can award several tasks.
+
+        Args:
+            latency_file (str): path of the JSON file where the histograms are exported at shutdown
+        """
+        self.logger = logging.getLogger('mrs.performance.latency')
+        self.latency_file = latency_file
+        self.histograms = {phase: LatencyHistogram() for phase in ROUND_PHASES[1:] + ['total']}
+
+        self._timestamps = dict()
+        self._lock = threading.Lock()
+
+    def mark(self, phase, round_id, task_id=None):
+        """ Timestamps a phase of round_id (and task_id, for phases after the election)
+        """
+        now = time.monotonic()
+        with self._lock:
+            timestamps = self._get_timestamps(round_id, task_id)
+            if phase == 'closed' and 'first_bid' in timestamps:
+                self._record('first_bid', timestamps['first_bid'], timestamps)
+                self._record('last_bid', timestamps['last_bid'], timestamps)
+            timestamps[phase] = now
+            self._record(phase, now, timestamps)
+            if phase == 'timetable_updated' and 'announced' in timestamps:
+                self.histograms['total'].record((now - timestamps['announced']) * 1000)
+
+    def mark_bid(self, round_id):
+        """ Timestamps the first and the last bid of round_id.
+        Their latencies are recorded when the round closes
+        """
+        now = time.monotonic()
+        with self._lock:
+            timestamps = self._get_timestamps(round_id)
+            timestamps.setdefault('first_bid', now)
+            timestamps['last_bid'] = now
+
+    def discard(self, round_id, task_id=None):
+        """ Forgets the timestamps of a finished round (or of a task whose contract has been concluded)
+        """
+        with self._lock:
+            self._timestamps.pop((round_id, task_id), None)
+
+    def _get_timestamps(self, round_id, task_id=None):
+        key = (round_id, task_id)
+        if key not in self._timestamps:
+            # The phases of a task continue the phases of its round
+            self._timestamps[key] = dict(self._timestamps.get((round_id, None), dict()))
+        return self._timestamps[key]
+
+    def _record(self, phase, timestamp, timestamps):
+        for previous_phase in reversed(ROUND_PHASES[:ROUND_PHASES.index(phase)]):
+            if previous_phase in timestamps:
+                self.histograms[phase].record((timestamp - timestamps[previous_phase]) * 1000)
+                return
+
+    def to_dict(self):
+        """ Returns the histograms of all phases. Can be called while rounds are being traced """
+        with self._lock:
+            return {phase: histogram.to_dict() for phase, histogram in self.histograms.items()}
+
+    def export(self, latency_file=None):
+        latency_file = latency_file or self.latency_file
+        if not latency_file:
+            return
+        self.logger.info("Exporting round latencies to %s", latency_file)
+        with open(latency_file, 'w') as file_:
+            json.dump(self.to_dict(), file_, indent=2)
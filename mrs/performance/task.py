@@ -10,9 +10,10 @@ class TaskPerformanceTracker:
     def __init__(self):
         self.logger = logging.getLogger("mrs.performance.task.tracker")
 
-    def update_allocation_metrics(self, task_id, timetable, allocation_time, only_constraints=False):
+    def update_allocation_metrics(self, task_id, timetable, allocation_time, only_constraints=False,
+                                  bidding_time=None):
         task_performance = TaskPerformance.get_task_performance(task_id)
-        metrics = self.get_allocation_metrics(task_id, timetable, allocation_time)
+        metrics = self.get_allocation_metrics(task_id, timetable, allocation_time, bidding_time)
         if only_constraints:
             task_performance.update_allocation(start_time=metrics.get("start_time"),
                                                pickup_time=metrics.get("pickup_time"),
@@ -21,7 +22,7 @@ class TaskPerformanceTracker:
             task_performance.update_allocation(**metrics)
             task_performance.allocated()
 
-    def get_allocation_metrics(self, task_id, timetable, allocation_time):
+    def get_allocation_metrics(self, task_id, timetable, allocation_time, bidding_time=None):
         time_to_allocate = allocation_time
         n_previously_allocated_tasks = len(timetable.get_tasks()) - 1
 
@@ -30,6 +31,7 @@ class TaskPerformanceTracker:
         delivery_time = timetable.get_timepoint_constraint(task_id, "delivery")
 
         return {'time_to_allocate': time_to_allocate,
+                'bidding_time': bidding_time,
                 'n_previously_allocated_tasks': n_previously_allocated_tasks,
                 'start_time': start_time,
                 'pickup_time': pickup_time,
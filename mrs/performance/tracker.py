@@ -20,10 +20,11 @@ class PerformanceTracker:
 
         self.logger = logging.getLogger("mrs.performance.tracker")
 
-    def update_allocation_metrics(self, task, allocation_time=None, only_constraints=False):
+    def update_allocation_metrics(self, task, allocation_time=None, only_constraints=False, bidding_time=None):
         for robot_id in task.assigned_robots:
             timetable = self.timetable_manager.get_timetable(robot_id)
-            self.task_performance_tracker.update_allocation_metrics(task.task_id, timetable, allocation_time, only_constraints)
+            self.task_performance_tracker.update_allocation_metrics(task.task_id, timetable, allocation_time,
+                                                                    only_constraints, bidding_time)
             self.robot_performance_tracker.update_allocated_tasks(robot_id, task.task_id)
             self.update_timetables(timetable)
 
@@ -9,9 +9,11 @@ from mrs.execution.schedule_execution_monitor import ScheduleExecutionMonitor
 from mrs.execution.scheduler import Scheduler
 from mrs.simulation.simulator import Simulator
 from mrs.timetable.timetable import Timetable
+from mrs.utils.travel_estimator import TravelEstimator
 
 _component_modules = {
     'simulator': Simulator,
+    'travel_estimator': TravelEstimator,
     'timetable': Timetable,
     'executor': Executor,
     'scheduler': Scheduler,
@@ -86,8 +88,11 @@ if __name__ == '__main__':
     components = config.config_robot(args.robot_id)
     robot = Robot(**components)
 
+    travel_estimator = components.get('travel_estimator')
+    travel_estimator.configure(planner=Planner(**config_params.get("executor")))
+
     for name, c in components.items():
         if hasattr(c, 'configure'):
-            c.configure(planner=Planner(**config_params.get("executor")))
+            c.configure(planner=travel_estimator)
 
     robot.run()
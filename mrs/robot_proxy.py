@@ -11,8 +11,12 @@ from mrs.config.params import get_config_params
 from mrs.simulation.simulator import Simulator
 from mrs.timetable.monitor import TimetableMonitorProxy
 from mrs.timetable.timetable import Timetable
+from mrs.timetable.writer import TimetableWriter
+from mrs.utils.travel_estimator import TravelEstimator
 
 _component_modules = {'simulator': Simulator,
+                      'travel_estimator': TravelEstimator,
+                      'timetable_writer': TimetableWriter,
                       'timetable': Timetable,
                       'timetable_monitor': TimetableMonitorProxy,
                       'bidder': Bidder,
@@ -28,6 +32,7 @@ class RobotProxy:
         self.robot_proxy_store = robot_proxy_store
         self.bidder = bidder
         self.timetable_monitor = timetable_monitor
+        self.timetable_writer = kwargs.get('timetable_writer')
         self.robot_model = RobotModel.create_new(robot_id)
 
         self.api.register_callbacks(self)
@@ -55,6 +60,8 @@ class RobotProxy:
         except (KeyboardInterrupt, SystemExit):
             self.logger.info("Terminating %s robot ...", self.robot_id)
             self.api.shutdown()
+            self.bidder.shutdown()
+            self.timetable_writer.shutdown()
             self.logger.info("Exiting...")
 
 
@@ -72,9 +79,12 @@ if __name__ == '__main__':
     config = Configurator(config_params, component_modules=_component_modules)
     components = config.config_robot_proxy(args.robot_id)
 
+    travel_estimator = components.get('travel_estimator')
+    travel_estimator.configure(planner=Planner(**config_params.get("planner")))
+
     for name, c in components.items():
         if hasattr(c, 'configure'):
-            c.configure(planner=Planner(**config_params.get("planner")))
+            c.configure(planner=travel_estimator)
 
     robot = RobotProxy(**components, d_graph_watchdog=config_params.get("d_graph_watchdog"))
     robot.run()
@@ -19,6 +19,10 @@ class Simulator:
         self._timer = None
         self.current_time = initial_time
 
+    @property
+    def factor(self):
+        return self._factor
+
     def set_initial_time(self, initial_time):
         initial_time = dateutil.parser.parse(initial_time).timestamp()
         self._env = simpy.Environment(initial_time=initial_time)
@@ -0,0 +1,334 @@
+""" Micro-benchmarks of the allocation path.
+
+Builds timetables with an increasing number of tasks for each stp solver and each registered
+bidding rule, and reports the latency and the memory allocations of:
+
+    - Bidder.compute_bid
+    - BiddingRuleBase.compute_bid
+    - Round.process_bid and Round.elect_winner
+    - TimetableManager.update_timetable
+
+By default the tasks and timetables are stored in an in-memory mongo store (mongomock), so the
+benchmarks run offline, without a mongo server, zyre or docker.
+
+Usage:
+    python3 benchmark.py --sizes 1 10 50 --solvers fpc --bidding_rules completion_time --output results.json
+"""
+import argparse
+import copy
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from fmlib.models.actions import GoTo
+from fmlib.models.requests import TransportationRequest
+from fmlib.models.tasks import TaskPlan
+from fmlib.models.tasks import TransportationTask, TransportationTaskConstraints
+from fmlib.models.tasks import TimepointConstraint, InterTimepointConstraint, TransportationTemporalConstraints
+from fmlib.utils.messages import MessageFactory
+from ropod.utils.timestamp import TimeStamp
+from ropod.utils.uuid import generate_uuid
+
+from mrs.allocation.bidder import Bidder
+from mrs.allocation.bidding_context import BiddingContext
+from mrs.allocation.bidding_rule import bidding_rule_factory
+from mrs.allocation.round import Round
+from mrs.messages.bid import Bid, AllocationInfo
+from mrs.timetable.stp import get_stp_solver
+from mrs.timetable.timetable import Timetable, TimetableManager
+
+SOLVERS = ['fpc', 'chain', 'srea', 'dsc']
+SIZES = [1, 10, 50, 100, 200]
+
+ROBOT_ID = "robot_001"
+ROBOT_LOCATION = "AMK_D_L-1_C39"
+PICKUP_LOCATION = "AMK_D_L-1_C41"
+DELIVERY_LOCATION = "AMK_B_L-1_C2"
+
+# Tasks in the timetable start every TASK_SEPARATION seconds, the first one FIRST_TASK_OFFSET seconds from now
+FIRST_TASK_OFFSET = 600
+TASK_SEPARATION = 300
+PICKUP_WINDOW = 60
+TASK_DURATION = (60, 1)
+
+
+def connect_in_memory_store(db_name='benchmark_store'):
+    """ Registers a mongomock database as the default pymodm connection,
+    so that the models are stored in memory
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise ImportError("The in-memory store requires mongomock. "
+                          "Install it (pip3 install mongomock) or use --store mongo")
+    from pymodm import connection
+
+    client = mongomock.MongoClient()
+    connection._CONNECTIONS[connection.DEFAULT_CONNECTION_ALIAS] = connection.ConnectionInfo(
+        parsed_uri={'database': db_name},
+        conn_string='mongomock://localhost/' + db_name,
+        database=client[db_name])
+    return client[db_name]
+
+
+def connect_mongo_store(db_name='benchmark_store', port=27017):
+    from fmlib.db.mongo import MongoStore, MongoStoreInterface
+
+    store = MongoStore(db_name=db_name, port=port)
+    MongoStoreInterface(store).clean()
+    return store
+
+
+def create_task(earliest_pickup_time, latest_pickup_time):
+    request = TransportationRequest(request_id=generate_uuid(),
+                                    pickup_location=PICKUP_LOCATION,
+                                    delivery_location=DELIVERY_LOCATION,
+                                    earliest_pickup_time=earliest_pickup_time,
+                                    latest_pickup_time=latest_pickup_time,
+                                    hard_constraints=True)
+    request.save()
+
+    pickup = TimepointConstraint(earliest_time=earliest_pickup_time, latest_time=latest_pickup_time)
+    temporal = TransportationTemporalConstraints(pickup=pickup, duration=InterTimepointConstraint())
+    constraints = TransportationTaskConstraints(hard=True, temporal=temporal)
+
+    task = TransportationTask.create_new(task_id=generate_uuid(), request=request.request_id,
+                                         constraints=constraints)
+
+    mean, variance = TASK_DURATION
+    task.update_duration(mean, variance)
+    action = GoTo.create_new(type="PICKUP-TO-DELIVERY", locations=[PICKUP_LOCATION, DELIVERY_LOCATION])
+    action.update_duration(mean, variance)
+    task.update_plan(TaskPlan(actions=[action]))
+    return task
+
+
+def create_tasks(n_tasks, initial_time):
+    tasks = list()
+    for i in range(n_tasks):
+        earliest_pickup_time = initial_time + timedelta(seconds=FIRST_TASK_OFFSET + i * TASK_SEPARATION)
+        latest_pickup_time = earliest_pickup_time + timedelta(seconds=PICKUP_WINDOW)
+        tasks.append(create_task(earliest_pickup_time, latest_pickup_time))
+    return tasks
+
+
+def build_timetable(solver_name, tasks, earliest_admissible_time):
+    """ Returns a stored timetable with the tasks allocated one after the other
+    """
+    timetable = Timetable(ROBOT_ID, get_stp_solver(solver_name))
+    travel_duration = InterTimepointConstraint(mean=1, variance=0.1)
+
+    for insertion_point, task in enumerate(tasks, start=1):
+        stn_task = timetable.to_stn_task(task, travel_duration, insertion_point, earliest_admissible_time)
+        timetable.insert_task(stn_task, insertion_point)
+        timetable.add_stn_task(stn_task)
+
+    if tasks:
+        timetable.dispatchable_graph = timetable.compute_dispatchable_graph(timetable.stn)
+    timetable.store()
+    return timetable
+
+
+def measure(operation, repeat, setup=None, teardown=None):
+    """ Runs the operation repeat times and returns its latency (in ms) and its memory allocations.
+    setup returns the arguments of the operation, teardown receives them. Neither is measured.
+    """
+    durations = list()
+    for _ in range(repeat + 1):
+        args = setup() if setup else tuple()
+        start = time.perf_counter()
+        operation(*args)
+        durations.append((time.perf_counter() - start) * 1000)
+        if teardown:
+            teardown(*args)
+    # The first run warms up the caches of the db and the solver
+    durations = durations[1:]
+
+    args = setup() if setup else tuple()
+    tracemalloc.start()
+    operation(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    allocated_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    if teardown:
+        teardown(*args)
+
+    return {'min_ms': min(durations),
+            'median_ms': statistics.median(durations),
+            'mean_ms': statistics.mean(durations),
+            'allocated_blocks': allocated_blocks,
+            'peak_kib': peak / 1024}
+
+
+def benchmark(solver_name, bidding_rule_name, n_tasks, repeat):
+    initial_time = datetime.now()
+    earliest_admissible_time = TimeStamp()
+
+    tasks = create_tasks(n_tasks, initial_time)
+    build_timetable(solver_name, tasks, earliest_admissible_time)
+
+    # The new task fits between any two tasks, so all insertion points are evaluated
+    new_task = create_task(initial_time + timedelta(seconds=FIRST_TASK_OFFSET - TASK_SEPARATION),
+                           initial_time + timedelta(seconds=FIRST_TASK_OFFSET + n_tasks * TASK_SEPARATION))
+
+    timetable = Timetable(ROBOT_ID, get_stp_solver(solver_name))
+    bidding_rule = bidding_rule_factory.get_bidding_rule(bidding_rule_name, timetable)
+    bidder = Bidder(ROBOT_ID, timetable, bidding_rule, "auctioneer")
+    round_id = generate_uuid()
+    results = dict()
+
+    def set_bidding_context():
+        bidder.bid_cache.clear()
+        bidder.bidding_context = BiddingContext(timetable, ROBOT_LOCATION)
+        return tuple()
+
+    results['Bidder.compute_bid'] = measure(
+        lambda: bidder.compute_bid(new_task, round_id, earliest_admissible_time),
+        repeat, setup=set_bidding_context)
+
+    bidder.bidding_context = BiddingContext(timetable, ROBOT_LOCATION)
+    insertion_point = n_tasks // 2 + 1
+
+    def insert_task():
+        allocation_info = bidder.get_allocation_info(new_task, insertion_point, earliest_admissible_time)
+        timetable.try_insertion(allocation_info.new_task, insertion_point, allocation_info.next_task)
+        return allocation_info,
+
+    def rollback(allocation_info):
+        timetable.rollback_insertion(insertion_point, allocation_info.prev_version_next_task)
+
+    results['BiddingRuleBase.compute_bid'] = measure(
+        lambda allocation_info: bidding_rule.compute_bid(timetable.stn, ROBOT_ID, round_id, new_task,
+                                                         allocation_info),
+        repeat, setup=insert_task, teardown=rollback)
+
+    bid = bidder.compute_bid(new_task, round_id, earliest_admissible_time)
+    bidder.bidding_context = None
+    results.update(benchmark_round(bid, new_task, n_tasks, repeat))
+    results.update(benchmark_update_timetable(solver_name, bid, new_task, repeat))
+    return results
+
+
+def benchmark_round(bid, task, n_robots, repeat):
+    """ Measures processing one bid per robot and electing the winner of the round
+    """
+    message_factory = MessageFactory()
+    robot_ids = ["robot_%03d" % i for i in range(1, n_robots + 1)]
+    closure_time = datetime.now() + timedelta(days=1)
+    results = dict()
+
+    def get_round():
+        round_ = Round(robot_ids, {task.task_id: task}, n_tasks=1, closure_time=closure_time)
+        round_.start()
+        payloads = list()
+        for i, robot_id in enumerate(robot_ids):
+            robot_bid = copy.copy(bid)
+            robot_bid.robot_id = robot_id
+            robot_bid.round_id = round_.id
+            robot_bid.metrics = copy.copy(bid.metrics)
+            robot_bid.metrics.objective += i
+            payloads.append(message_factory.create_message(robot_bid)['payload'])
+        return round_, payloads
+
+    def process_bids(round_, payloads):
+        for payload in payloads:
+            round_.process_bid(payload, Bid)
+
+    def get_closed_round():
+        round_, payloads = get_round()
+        process_bids(round_, payloads)
+        return round_,
+
+    results['Round.process_bid'] = measure(process_bids, repeat, setup=get_round)
+    results['Round.elect_winner'] = measure(lambda round_: round_.elect_winner(), repeat,
+                                            setup=get_closed_round)
+    return results
+
+
+def benchmark_update_timetable(solver_name, bid, task, repeat):
+    """ Measures updating the timetable of the winning robot, with and without
+    the dispatchable graph attached by the robot
+    """
+    timetable_manager = TimetableManager(get_stp_solver(solver_name))
+    timetable_manager.register_robot(ROBOT_ID)
+    timetable = timetable_manager.get_timetable(ROBOT_ID)
+    allocation_info = bid.get_allocation_info()
+    results = dict()
+
+    def get_allocation_info(attached):
+        if attached:
+            allocation_info.attach_dispatchable_graph()
+        # The auctioneer receives the allocation info in a msg
+        received_allocation_info = AllocationInfo.from_dict(allocation_info.to_dict())
+        timetable_manager[ROBOT_ID] = copy.deepcopy(timetable)
+        return received_allocation_info,
+
+    def update_timetable(received_allocation_info):
+        timetable_manager.update_timetable(ROBOT_ID, received_allocation_info, task)
+
+    results['TimetableManager.update_timetable'] = measure(
+        update_timetable, repeat, setup=lambda: get_allocation_info(False))
+    results['TimetableManager.update_timetable[attached]'] = measure(
+        update_timetable, repeat, setup=lambda: get_allocation_info(True))
+
+    timetable_manager[ROBOT_ID] = timetable
+    timetable.store()
+    return results
+
+
+def print_results(solver_name, bidding_rule_name, n_tasks, results):
+    print("\nsolver: %s, bidding rule: %s, tasks: %s" % (solver_name, bidding_rule_name, n_tasks))
+    for operation, result in results.items():
+        if 'error' in result:
+            print("  %-45s error: %s" % (operation, result['error']))
+            continue
+        print("  %-45s median: %9.3f ms  min: %9.3f ms  blocks: %8d  peak: %10.1f KiB" %
+              (operation, result['median_ms'], result['min_ms'], result['allocated_blocks'], result['peak_kib']))
+
+
+def run(solvers, bidding_rules, sizes, repeat):
+    results = list()
+    for solver_name in solvers:
+        for bidding_rule_name in bidding_rules:
+            for n_tasks in sizes:
+                try:
+                    operations = benchmark(solver_name, bidding_rule_name, n_tasks, repeat)
+                except Exception as e:
+                    operations = {'benchmark': {'error': repr(e)}}
+                print_results(solver_name, bidding_rule_name, n_tasks, operations)
+                results.append({'solver': solver_name,
+                                'bidding_rule': bidding_rule_name,
+                                'n_tasks': n_tasks,
+                                'operations': operations})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='Number of tasks in the timetable (and of bidding robots)')
+    parser.add_argument('--solvers', type=str, nargs='+', default=SOLVERS, choices=SOLVERS,
+                        help='Name of the stp solvers')
+    parser.add_argument('--bidding_rules', type=str, nargs='+', default=sorted(bidding_rule_factory),
+                        choices=sorted(bidding_rule_factory), help='Name of the bidding rules')
+    parser.add_argument('--repeat', type=int, action='store', default=10, help='Runs per operation')
+    parser.add_argument('--store', type=str, action='store', default='memory', choices=['memory', 'mongo'],
+                        help='memory: in-memory store (mongomock), mongo: mongo server running in localhost')
+    parser.add_argument('--output', type=str, action='store', help='Path to a json file to write the results')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.store == 'memory':
+        connect_in_memory_store()
+    else:
+        connect_mongo_store()
+
+    results_ = run(args.solvers, args.bidding_rules, args.sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results_, outfile, indent=2)
@@ -0,0 +1,158 @@
+""" Allocation-scalability benchmark.
+
+Runs the CCU and N robot proxies in one process. The components communicate through an in-memory
+loopback bus instead of zyre, and share one store (by default an in-memory mongo store, mongomock),
+so the benchmark runs offline, without docker, zyre or a mongo server.
+
+For each fleet size, the CCU allocates the same number of tasks and the script reports the allocation
+throughput, the number of messages and the latency of the phases of the auction rounds.
+
+Usage:
+    python3 scalability.py --n_robots 5 10 50 --n_tasks 20 --output results.json
+"""
+import argparse
+import copy
+import json
+import time
+from datetime import datetime
+
+from mrs.ccu import CCU
+from mrs.ccu import _component_modules as ccu_component_modules
+from mrs.config.configurator import Configurator
+from mrs.config.params import get_config_params
+from mrs.db.models.performance.robot import RobotPerformance
+from mrs.db.models.performance.task import TaskPerformance
+from mrs.robot_proxy import RobotProxy
+from mrs.robot_proxy import _component_modules as robot_proxy_component_modules
+from mrs.tests.benchmark import connect_in_memory_store, connect_mongo_store, create_tasks
+from mrs.utils.loopback import LoopbackBus
+
+N_ROBOTS = [5, 10, 25, 50]
+N_TASKS = 20
+
+
+def configure_components(components, planner, **kwargs):
+    travel_estimator = components.get("travel_estimator")
+    travel_estimator.configure(planner=planner)
+
+    for name, component in components.items():
+        if hasattr(component, 'configure'):
+            component.configure(planner=travel_estimator, **kwargs)
+
+
+def create_ccu(config_params, bus, store, planner):
+    config = Configurator(copy.deepcopy(config_params), component_modules=ccu_component_modules,
+                          api_bus=bus, store=store)
+    components = config.config_ccu()
+    configure_components(components, planner, performance_tracker=components.get("performance_tracker"))
+    return CCU(components)
+
+
+def create_robot_proxy(config_params, robot_id, bus, store, planner):
+    config = Configurator(copy.deepcopy(config_params), component_modules=robot_proxy_component_modules,
+                          api_bus=bus, store=store)
+    components = config.config_robot_proxy(robot_id)
+    configure_components(components, planner)
+    return RobotProxy(**components)
+
+
+def allocate(ccu, tasks, timeout):
+    """ Runs the allocation components of the CCU until all tasks are allocated or the timeout expires
+
+    Returns:
+        float: time (in seconds) it took to allocate the tasks
+        int: number of allocated tasks
+    """
+    n_allocated = 0
+    start = time.perf_counter()
+    ccu.auctioneer.allocate(tasks)
+
+    while n_allocated < len(tasks) and time.perf_counter() - start < timeout:
+        ccu.auctioneer.run()
+        n_allocated += len(ccu.auctioneer.allocations)
+        ccu.process_allocation()
+        ccu.timetable_writer.flush()
+        ccu.event_loop.wait()
+
+    return time.perf_counter() - start, n_allocated
+
+
+def benchmark(config_params, n_robots, n_tasks, planner, store_type, serialize, timeout):
+    robot_ids = ["robot_%03d" % i for i in range(1, n_robots + 1)]
+    config_params = copy.deepcopy(config_params)
+    config_params.update(fleet=robot_ids)
+    # The components use the wall-clock time
+    config_params.pop('simulator', None)
+
+    db_name = 'scalability_%s_robots' % n_robots
+    store = connect_in_memory_store(db_name) if store_type == 'memory' else connect_mongo_store(db_name)
+    bus = LoopbackBus(serialize=serialize)
+
+    ccu = create_ccu(config_params, bus, store, planner)
+    robot_proxies = [create_robot_proxy(config_params, robot_id, bus, store, planner) for robot_id in robot_ids]
+
+    for robot_id in robot_ids:
+        RobotPerformance.create_new(robot_id=robot_id)
+    tasks = create_tasks(n_tasks, datetime.now())
+    for task in tasks:
+        TaskPerformance.create_new(task_id=task.task_id)
+
+    ccu.api.start()
+    for robot_proxy in robot_proxies:
+        robot_proxy.api.start()
+
+    try:
+        allocation_time, n_allocated = allocate(ccu, tasks, timeout)
+    finally:
+        bus.shutdown()
+        for component in [ccu] + robot_proxies:
+            component.timetable_writer.shutdown()
+
+    return {'n_robots': n_robots,
+            'n_tasks': n_tasks,
+            'n_allocated': n_allocated,
+            'allocation_time_s': allocation_time,
+            'throughput_tasks_per_s': n_allocated / allocation_time,
+            'messages': bus.get_stats(),
+            'timetable_writes': ccu.timetable_writer.get_stats(),
+            'round_latencies': ccu.auctioneer.round_tracer.to_dict()}
+
+
+def print_results(results):
+    print("\nrobots: %s, tasks allocated: %s/%s" % (results['n_robots'], results['n_allocated'], results['n_tasks']))
+    print("  allocation time: %9.3f s  throughput: %8.3f tasks/s  messages: %s" %
+          (results['allocation_time_s'], results['throughput_tasks_per_s'], results['messages']))
+    for phase, histogram in results['round_latencies'].items():
+        if histogram['count']:
+            print("  %-20s p50: %9.3f ms  p99: %9.3f ms  max: %9.3f ms" %
+                  (phase, histogram['p50'], histogram['p99'], histogram['max']))
+
+
+if __name__ == '__main__':
+    from planner.planner import Planner
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', type=str, action='store', help='Path to the config file')
+    parser.add_argument('--n_robots', type=int, nargs='+', default=N_ROBOTS, help='Number of robots (fleet sizes)')
+    parser.add_argument('--n_tasks', type=int, action='store', default=N_TASKS, help='Number of tasks to allocate')
+    parser.add_argument('--store', type=str, action='store', default='memory', choices=['memory', 'mongo'],
+                        help='memory: in-memory store (mongomock), mongo: mongo server running in localhost')
+    parser.add_argument('--no_serialization', action='store_true',
+                        help='Pass the messages as dicts instead of encoding them to json')
+    parser.add_argument('--timeout', type=float, action='store', default=600,
+                        help='Max time (in seconds) to allocate the tasks of each fleet size')
+    parser.add_argument('--output', type=str, action='store', help='Path to a json file to write the results')
+    args = parser.parse_args()
+
+    config_params_ = get_config_params(args.file)
+    planner_ = Planner(**config_params_.get("planner"))
+
+    results_ = list()
+    for n_robots_ in args.n_robots:
+        results_.append(benchmark(config_params_, n_robots_, args.n_tasks, planner_, args.store,
+                                  not args.no_serialization, args.timeout))
+        print_results(results_[-1])
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results_, outfile, indent=2)
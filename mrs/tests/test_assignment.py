@@ -0,0 +1,97 @@
+""" Compares the Hungarian algorithm of the assignment allocation with brute force
+
+Run with: python -m unittest mrs.tests.test_assignment
+"""
+import itertools
+import random
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from mrs.allocation.assignment import get_assignment, get_cost_matrix, solve_assignment
+
+
+def brute_force_assignment(cost_matrix):
+    """ Returns the number of feasible (finite cost) pairs and the total cost of the assignment that
+    assigns the most feasible pairs at the smallest cost
+    """
+    n_rows, n_columns = cost_matrix.shape
+    best = (0, 0)
+    if n_rows <= n_columns:
+        assignments = (list(zip(range(n_rows), columns))
+                       for columns in itertools.permutations(range(n_columns), n_rows))
+    else:
+        assignments = (list(zip(rows, range(n_columns)))
+                       for rows in itertools.permutations(range(n_rows), n_columns))
+
+    for assignment in assignments:
+        costs = [cost_matrix[i, j] for i, j in assignment if np.isfinite(cost_matrix[i, j])]
+        best = min(best, (-len(costs), sum(costs)))
+    return -best[0], best[1]
+
+
+def create_bid(robot_id, task_id, risk, objective):
+    return SimpleNamespace(robot_id=robot_id, task_id=task_id,
+                           metrics=SimpleNamespace(risk=risk, objective=objective))
+
+
+class TestAssignment(unittest.TestCase):
+
+    def assert_valid_assignment(self, assignment):
+        rows = [i for i, _ in assignment]
+        columns = [j for _, j in assignment]
+        self.assertEqual(len(rows), len(set(rows)))
+        self.assertEqual(len(columns), len(set(columns)))
+
+    def test_empty(self):
+        self.assertEqual([], solve_assignment(np.zeros((0, 3))))
+        self.assertEqual([], get_assignment([]))
+
+    def test_square(self):
+        cost_matrix = np.array([[4, 1, 3],
+                                [2, 0, 5],
+                                [3, 2, 2]])
+        self.assertEqual([(0, 1), (1, 0), (2, 2)], solve_assignment(cost_matrix))
+
+    def test_random_matrices(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            n_rows, n_columns = rng.randint(1, 5), rng.randint(1, 5)
+            cost_matrix = np.array([[rng.randint(-10, 50) for _ in range(n_columns)] for _ in range(n_rows)],
+                                   dtype=float)
+
+            assignment = solve_assignment(cost_matrix)
+            self.assert_valid_assignment(assignment)
+            self.assertEqual(min(n_rows, n_columns), len(assignment))
+            cost = sum(cost_matrix[i, j] for i, j in assignment)
+            self.assertAlmostEqual(brute_force_assignment(cost_matrix)[1], cost)
+
+    def test_random_bids(self):
+        """ Robots do not bid for all tasks, the missing bids have an infinite cost """
+        rng = random.Random(1)
+        for _ in range(300):
+            robot_ids = ['robot_%03d' % i for i in range(rng.randint(1, 5))]
+            task_ids = ['task_%03d' % j for j in range(rng.randint(1, 5))]
+            bids = [create_bid(robot_id, task_id, rng.randint(0, 2), rng.randint(0, 100))
+                    for robot_id in robot_ids for task_id in task_ids if rng.random() < 0.6]
+
+            assigned_bids = get_assignment(bids)
+            if not bids:
+                self.assertEqual([], assigned_bids)
+                continue
+
+            robot_ids = sorted({bid.robot_id for bid in bids})
+            task_ids = sorted({bid.task_id for bid in bids})
+            cost_matrix = get_cost_matrix(bids, robot_ids, task_ids)
+            assignment = [(robot_ids.index(bid.robot_id), task_ids.index(bid.task_id)) for bid in assigned_bids]
+
+            self.assert_valid_assignment(assignment)
+            self.assertTrue(all(bid in bids for bid in assigned_bids))
+            n_pairs, cost = brute_force_assignment(cost_matrix)
+            self.assertEqual(n_pairs, len(assignment))
+            self.assertAlmostEqual(cost, sum(cost_matrix[i, j] for i, j in assignment))
+
+
+if __name__ == '__main__':
+    unittest.main()
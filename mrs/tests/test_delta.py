@@ -0,0 +1,102 @@
+""" Stores a timetable with field-level updates and checkpoints (see TimetableDeltas) in an in-memory
+mongo store and checks that the timetable fetched from the store equals the stored one
+
+Requires mongomock. Run with: python -m unittest mrs.tests.test_delta
+"""
+import unittest
+
+from mrs.tests.benchmark import connect_in_memory_store
+from mrs.tests.test_insertion import create_timetable, get_graph
+from mrs.tests.test_stp import create_stn_task
+from mrs.timetable.delta import TimetableDeltas, TimetableUpdate, get_delta
+from mrs.timetable.stp import get_stp_solver
+from mrs.timetable.timetable import Timetable
+from mrs.timetable.writer import TimetableWriter
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+class TestGetDelta(unittest.TestCase):
+
+    def test_delta(self):
+        old = {'a': 1, 'b': {'c': 2, 'd': [1, 2]}, 'e': 3}
+        new = {'a': 1, 'b': {'c': 4, 'd': [1, 2, 3], 'f': 5}, 'g': 6}
+        set_fields, unset_fields = get_delta(old, new)
+        self.assertEqual({'b.c': 4, 'b.d': [1, 2, 3], 'b.f': 5, 'g': 6}, set_fields)
+        self.assertEqual(['e'], unset_fields)
+
+    def test_no_delta(self):
+        document = {'a': 1, 'b': {'c': 2}}
+        self.assertEqual(({}, []), get_delta(document, dict(document)))
+
+
+@unittest.skipUnless(mongomock, "The in-memory store requires mongomock")
+class TestDeltaRoundTrip(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        connect_in_memory_store('test_delta_store')
+
+    def setUp(self):
+        self.writer = TimetableWriter(delta_persistence=True, checkpoint_interval=3)
+        self.timetable = create_timetable('fpc', [create_stn_task(100, 20, 5, 10)])
+        self.timetable.writer = self.writer
+        self.r_earliest_pickup_time = 100
+
+    def add_task(self):
+        self.r_earliest_pickup_time += 100
+        stn_task = create_stn_task(self.r_earliest_pickup_time, 20, 5, 10)
+        self.timetable.insert_task(stn_task, len(self.timetable.stn_tasks) + 1)
+        self.timetable.add_stn_task(stn_task)
+        self.timetable.dispatchable_graph = self.timetable.compute_dispatchable_graph(self.timetable.stn)
+        self.timetable.store()
+
+    def remove_first_task(self):
+        task_id = self.timetable.stn.get_task_id(1)
+        self.timetable.remove_task(task_id)
+
+    def assert_fetched(self):
+        fetched = Timetable(self.timetable.robot_id, get_stp_solver('fpc'))
+        fetched.fetch()
+        self.assertEqual(get_graph(self.timetable.stn), get_graph(fetched.stn))
+        self.assertEqual(get_graph(self.timetable.dispatchable_graph), get_graph(fetched.dispatchable_graph))
+        self.assertEqual({task_id: task.to_dict() for task_id, task in self.timetable.stn_tasks.items()},
+                         {task_id: task.to_dict() for task_id, task in fetched.stn_tasks.items()})
+
+    def test_updates_and_checkpoints(self):
+        self.timetable.store()
+        self.assert_fetched()
+
+        for k in range(8):
+            if k % 3 == 2:
+                self.remove_first_task()
+            else:
+                self.add_task()
+            self.assert_fetched()
+
+        stats = self.writer.get_stats()
+        self.assertEqual(0, stats['failed_writes'])
+        self.assertGreater(stats['updates'], 0)
+        # The first store and at least one store after checkpoint_interval updates are checkpoints
+        self.assertGreaterEqual(stats['writes'] - stats['updates'], 2)
+
+    def test_unchanged_timetable(self):
+        deltas = TimetableDeltas()
+        self.assertNotIsInstance(deltas.get_write(self.timetable), TimetableUpdate)
+        self.assertIsNone(deltas.get_write(self.timetable))
+
+    def test_reset(self):
+        deltas = TimetableDeltas()
+        deltas.get_write(self.timetable)
+        self.add_task()
+        self.assertIsInstance(deltas.get_write(self.timetable), TimetableUpdate)
+        deltas.reset(self.timetable.robot_id)
+        self.add_task()
+        self.assertNotIsInstance(deltas.get_write(self.timetable), TimetableUpdate)
+
+
+if __name__ == '__main__':
+    unittest.main()
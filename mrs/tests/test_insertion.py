@@ -0,0 +1,126 @@
+""" Checks that the tentative insertions of the bidder (try_insertion, solve, rollback_insertion)
+leave the stn of the timetable unchanged and give the same dispatchable graphs as inserting the task
+in a copy of the stn
+
+Run with: python -m unittest mrs.tests.test_insertion
+"""
+import copy
+import random
+import unittest
+
+from stn.exceptions.stp import NoSTPSolution
+
+from mrs.tests.test_stp import create_random_stn_tasks, create_stn_task
+from mrs.timetable.stp import get_stp_solver
+from mrs.timetable.timetable import Timetable
+
+
+def create_timetable(solver_name, stn_tasks):
+    timetable = Timetable('robot_001', get_stp_solver(solver_name))
+    for insertion_point, stn_task in enumerate(stn_tasks, start=1):
+        timetable.insert_task(stn_task, insertion_point)
+        timetable.add_stn_task(stn_task)
+    return timetable
+
+
+def get_graph(stn):
+    """ Returns the nodes and links of the stn, regardless of their order in the graph """
+    stn_dict = stn.to_dict()
+    nodes = sorted(stn_dict['nodes'], key=lambda node: node['id'])
+    links = sorted(stn_dict['links'], key=lambda link: (link['source'], link['target']))
+    return nodes, links
+
+
+def get_weights(dispatchable_graph):
+    return {(i, j): weight for i, j, weight in dispatchable_graph.edges(data='weight')}
+
+
+class TestTentativeInsertion(unittest.TestCase):
+
+    solver_names = ['fpc', 'chain']
+
+    def solve_copy(self, timetable, stn_task, insertion_point, next_stn_task):
+        """ Inserts the task in a copy of the stn, as the bidder did before tentative insertions """
+        stn = copy.deepcopy(timetable.stn)
+        stn.add_task(stn_task, insertion_point)
+        if next_stn_task is not None:
+            stn.update_task(next_stn_task)
+        try:
+            return timetable.compute_dispatchable_graph(stn)
+        except NoSTPSolution:
+            return None
+
+    def evaluate_insertion(self, timetable, stn_task, insertion_point, next_stn_task):
+        """ Same steps as Bidder.evaluate_insertion """
+        prev_version_next_stn_task = None
+        if next_stn_task is not None:
+            prev_version_next_stn_task = timetable.get_stn_task(next_stn_task.task_id)
+
+        dispatchable_graph = None
+        if timetable.try_insertion(stn_task, insertion_point, next_stn_task):
+            try:
+                dispatchable_graph = timetable.compute_dispatchable_graph(timetable.stn)
+            except NoSTPSolution:
+                pass
+        timetable.rollback_insertion(insertion_point, prev_version_next_stn_task)
+        return dispatchable_graph
+
+    def assert_same_insertion(self, timetable, stn_task, insertion_point, next_stn_task=None):
+        graph = get_graph(timetable.stn)
+        expected = self.solve_copy(timetable, copy.deepcopy(stn_task), insertion_point,
+                                   copy.deepcopy(next_stn_task))
+        dispatchable_graph = self.evaluate_insertion(timetable, copy.deepcopy(stn_task), insertion_point,
+                                                     copy.deepcopy(next_stn_task))
+
+        self.assertEqual(graph, get_graph(timetable.stn))
+        if expected is None:
+            self.assertIsNone(dispatchable_graph)
+            return False
+
+        self.assertIsNotNone(dispatchable_graph)
+        self.assertEqual(get_weights(expected), get_weights(dispatchable_graph))
+        self.assertEqual(expected.compute_temporal_metric('completion_time'),
+                         dispatchable_graph.compute_temporal_metric('completion_time'))
+        return True
+
+    def test_insertion_in_the_middle(self):
+        for solver_name in self.solver_names:
+            timetable = create_timetable(solver_name, [create_stn_task(10, 20, 5, 10),
+                                                       create_stn_task(80, 10, 8, 6)])
+            next_stn_task = copy.deepcopy(timetable.get_stn_task(timetable.stn.get_task_id(2)))
+            start = next_stn_task.get_timepoint("start")
+            next_stn_task.update_timepoint("start", start.r_earliest_time + 5, start.r_latest_time)
+
+            self.assertTrue(self.assert_same_insertion(timetable, create_stn_task(40, 10, 4, 8), 2,
+                                                       next_stn_task))
+
+    def test_inconsistent_insertion(self):
+        for solver_name in self.solver_names:
+            timetable = create_timetable(solver_name, [create_stn_task(50, 0, 5, 30)])
+            # The task has to be picked up before the first task is delivered
+            self.assertFalse(self.assert_same_insertion(timetable, create_stn_task(60, 0, 5, 6), 2))
+
+    def test_random_insertions(self):
+        rng = random.Random(0)
+        for solver_name in self.solver_names:
+            n_consistent = 0
+            for _ in range(50):
+                stn_tasks = create_random_stn_tasks(rng, rng.randint(0, 5))
+                timetable = create_timetable(solver_name, stn_tasks)
+                stn_task = create_random_stn_tasks(rng, 1)[0]
+
+                for insertion_point in range(1, len(stn_tasks) + 2):
+                    next_stn_task = None
+                    if insertion_point <= len(stn_tasks):
+                        next_stn_task = copy.deepcopy(stn_tasks[insertion_point-1])
+                        start = next_stn_task.get_timepoint("start")
+                        next_stn_task.update_timepoint("start", start.r_earliest_time + rng.randint(-10, 10),
+                                                       start.r_latest_time)
+                    if self.assert_same_insertion(timetable, stn_task, insertion_point, next_stn_task):
+                        n_consistent += 1
+
+            self.assertGreater(n_consistent, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
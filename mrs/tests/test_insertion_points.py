@@ -0,0 +1,122 @@
+""" Compares the best insertion of a task over the insertion points kept by the pruning of the timetable
+(Timetable.get_insertion_points with TimetableManager.get_insertion_bounds) with the best insertion over
+all insertion points
+
+Run with: python -m unittest mrs.tests.test_insertion_points
+"""
+import copy
+import random
+import unittest
+import uuid
+from types import SimpleNamespace
+
+from stn.exceptions.stp import NoSTPSolution
+
+from mrs.tests.test_insertion import create_timetable
+from mrs.tests.test_stp import create_random_stn_tasks, create_stn_task
+from mrs.timetable.timetable import TimetableManager
+from mrs.timetable.stp import get_stp_solver
+from mrs.utils.time import to_timestamp
+
+
+def create_task(timetable, stn_task):
+    """ Returns a task with hard constraints and the pickup window of the stn task """
+    pickup = stn_task.get_timepoint("pickup")
+    pickup_constraint = SimpleNamespace(earliest_time=to_timestamp(timetable.ztp, pickup.r_earliest_time).to_datetime(),
+                                        latest_time=to_timestamp(timetable.ztp, pickup.r_latest_time).to_datetime())
+    return SimpleNamespace(task_id=stn_task.task_id, hard_constraints=True, pickup_constraint=pickup_constraint)
+
+
+def update_start(stn_task, travel_time):
+    """ Returns a copy of the stn task whose start is travel_time before its pickup """
+    stn_task = copy.deepcopy(stn_task)
+    pickup = stn_task.get_timepoint("pickup")
+    stn_task.update_timepoint("start", pickup.r_earliest_time - travel_time, pickup.r_latest_time - travel_time)
+    return stn_task
+
+
+class TestInsertionPoints(unittest.TestCase):
+
+    temporal_criteria = ['completion_time', 'makespan']
+
+    def setUp(self):
+        self.timetable_manager = TimetableManager(get_stp_solver('fpc'))
+
+    def evaluate_insertions(self, timetable, stn_tasks, stn_task, travel_time, insertion_points):
+        """ Returns the temporal metrics of inserting the stn task in each insertion point where the stn
+        is consistent. The start of the task that follows the insertion point is travel_time before its pickup
+        """
+        metrics = dict()
+        for insertion_point in insertion_points:
+            stn = copy.deepcopy(timetable.stn)
+            stn.add_task(copy.deepcopy(stn_task), insertion_point)
+            if insertion_point <= len(stn_tasks):
+                stn.update_task(update_start(stn_tasks[insertion_point-1], travel_time))
+            try:
+                dispatchable_graph = timetable.compute_dispatchable_graph(stn)
+            except NoSTPSolution:
+                continue
+            metrics[insertion_point] = [dispatchable_graph.compute_temporal_metric(criterion)
+                                        for criterion in self.temporal_criteria]
+        return metrics
+
+    @staticmethod
+    def get_best_insertions(metrics):
+        """ Returns the best (metric, insertion point) per temporal criterion """
+        if not metrics:
+            return None
+        n_criteria = len(next(iter(metrics.values())))
+        return [min((values[k], insertion_point) for insertion_point, values in metrics.items())
+                for k in range(n_criteria)]
+
+    def assert_same_best_insertion(self, robot_id, stn_tasks, stn_task, travel_time):
+        timetable = create_timetable('fpc', stn_tasks)
+        timetable.robot_id = robot_id
+        self.timetable_manager[robot_id] = timetable
+        task = create_task(timetable, stn_task)
+
+        all_insertion_points = range(1, len(stn_tasks) + 2)
+        insertion_bounds = self.timetable_manager.get_insertion_bounds(robot_id)
+        insertion_points = timetable.get_insertion_points(task, insertion_bounds)
+
+        metrics = self.evaluate_insertions(timetable, stn_tasks, stn_task, travel_time, all_insertion_points)
+        pruned_metrics = self.evaluate_insertions(timetable, stn_tasks, stn_task, travel_time, insertion_points)
+
+        # The pruning only discards infeasible insertion points
+        self.assertTrue(set(metrics).issubset(insertion_points),
+                        "Feasible %s, kept %s" % (sorted(metrics), list(insertion_points)))
+        self.assertEqual(self.get_best_insertions(metrics), self.get_best_insertions(pruned_metrics))
+        if metrics:
+            self.assertTrue(self.timetable_manager.has_capacity(robot_id, task))
+        return len(insertion_points), len(metrics)
+
+    def test_no_overlap(self):
+        stn_tasks = [create_stn_task(10, 10, 5, 10), create_stn_task(100, 10, 5, 10), create_stn_task(200, 10, 5, 10)]
+        # The task only fits between the second and the third task
+        n_insertion_points, n_feasible = self.assert_same_best_insertion('robot_001', stn_tasks,
+                                                                         create_stn_task(150, 5, 5, 10), 5)
+        self.assertEqual(1, n_feasible)
+        self.assertLess(n_insertion_points, len(stn_tasks) + 1)
+
+    def test_random_insertions(self):
+        rng = random.Random(0)
+        n_pruned = 0
+        n_feasible = 0
+        for _ in range(200):
+            stn_tasks = create_random_stn_tasks(rng, rng.randint(0, 8))
+            r_earliest_pickup_time = rng.randint(-20, 60 * max(1, len(stn_tasks)))
+            stn_task = create_stn_task(r_earliest_pickup_time,
+                                       pickup_time_window=rng.randint(0, 30),
+                                       travel_time=rng.randint(1, 30),
+                                       work_time=rng.randint(1, 30))
+            n_insertion_points, n_feasible_points = self.assert_same_best_insertion(str(uuid.uuid4()), stn_tasks,
+                                                                                    stn_task, rng.randint(1, 30))
+            n_pruned += len(stn_tasks) + 1 - n_insertion_points
+            n_feasible += n_feasible_points > 0
+
+        self.assertGreater(n_pruned, 0)
+        self.assertGreater(n_feasible, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
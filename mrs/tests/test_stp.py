@@ -0,0 +1,114 @@
+""" Compares the chain solver of the timetables with the fpc solver of the stn package
+
+Run with: python -m unittest mrs.tests.test_stp
+"""
+import random
+import unittest
+import uuid
+
+from stn.exceptions.stp import NoSTPSolution
+from stn.stp import STP
+from stn.task import Edge
+from stn.task import Task as STNTask
+from stn.task import Timepoint
+
+from mrs.timetable.stp import ChainSTP
+
+
+def create_stn_task(r_earliest_pickup_time, pickup_time_window, travel_time, work_time):
+    """ Returns an stn task whose start is travel_time before the pickup and whose delivery is
+    work_time after the pickup
+    """
+    r_latest_pickup_time = r_earliest_pickup_time + pickup_time_window
+    timepoints = [Timepoint(name="start",
+                            r_earliest_time=r_earliest_pickup_time - travel_time,
+                            r_latest_time=r_latest_pickup_time - travel_time),
+                  Timepoint(name="pickup", r_earliest_time=r_earliest_pickup_time, r_latest_time=r_latest_pickup_time),
+                  Timepoint(name="delivery", r_earliest_time=r_earliest_pickup_time + work_time)]
+    edges = [Edge(name="travel_time", mean=travel_time, variance=0.1),
+             Edge(name="work_time", mean=work_time, variance=0.1)]
+    return STNTask(str(uuid.uuid4()), timepoints, edges, str(uuid.uuid4()), str(uuid.uuid4()))
+
+
+def create_stn(stn_tasks):
+    """ Returns an stn of the stn package with the stn tasks one after the other """
+    stn = STP('fpc').get_stn()()
+    for insertion_point, stn_task in enumerate(stn_tasks, start=1):
+        stn.add_task(stn_task, insertion_point)
+    return stn
+
+
+def create_random_stn_tasks(rng, n_tasks):
+    stn_tasks = list()
+    r_earliest_pickup_time = 0
+    for _ in range(n_tasks):
+        r_earliest_pickup_time += rng.randint(-20, 60)
+        stn_tasks.append(create_stn_task(r_earliest_pickup_time,
+                                         pickup_time_window=rng.randint(0, 30),
+                                         travel_time=rng.randint(1, 30),
+                                         work_time=rng.randint(1, 30)))
+    return stn_tasks
+
+
+def create_random_stn(rng, n_tasks):
+    return create_stn(create_random_stn_tasks(rng, n_tasks))
+
+
+class TestChainSTP(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = ChainSTP()
+        self.fpc = STP('fpc')
+
+    def assert_same_dispatchable_graph(self, stn):
+        expected = self.fpc.solve(stn)
+        dispatchable_graph = self.chain.solve(stn)
+
+        expected_weights = {(i, j): weight for i, j, weight in expected.edges(data='weight')}
+        weights = {(i, j): weight for i, j, weight in dispatchable_graph.edges(data='weight')}
+        self.assertEqual(set(expected_weights), set(weights))
+        for edge, weight in expected_weights.items():
+            self.assertAlmostEqual(weight, weights[edge], msg="Edge %s" % (edge,))
+
+        self.assertEqual(expected.risk_metric, dispatchable_graph.risk_metric)
+
+    def test_chain(self):
+        stn = create_stn([create_stn_task(10, 20, 5, 10),
+                          create_stn_task(40, 10, 8, 6),
+                          create_stn_task(60, 30, 3, 12)])
+        self.assert_same_dispatchable_graph(stn)
+
+    def test_stn_is_not_modified(self):
+        stn = create_stn([create_stn_task(10, 20, 5, 10), create_stn_task(40, 10, 8, 6)])
+        weights = list(stn.edges(data='weight'))
+        self.chain.solve(stn)
+        self.assertEqual(weights, list(stn.edges(data='weight')))
+
+    def test_inconsistent_chain(self):
+        # The second task has to be picked up before the first one is delivered
+        stn = create_stn([create_stn_task(50, 0, 5, 30), create_stn_task(60, 0, 5, 6)])
+        self.assertFalse(self.fpc.is_consistent(stn))
+        self.assertFalse(self.chain.is_consistent(stn))
+        with self.assertRaises(NoSTPSolution):
+            self.fpc.solve(stn)
+        with self.assertRaises(NoSTPSolution):
+            self.chain.solve(stn)
+
+    def test_random_chains(self):
+        rng = random.Random(0)
+        n_consistent = 0
+        for _ in range(200):
+            stn = create_random_stn(rng, rng.randint(1, 8))
+            is_consistent = self.fpc.is_consistent(stn)
+            self.assertEqual(is_consistent, self.chain.is_consistent(stn))
+            if is_consistent:
+                n_consistent += 1
+                self.assert_same_dispatchable_graph(stn)
+            else:
+                with self.assertRaises(NoSTPSolution):
+                    self.chain.solve(stn)
+        self.assertGreater(n_consistent, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
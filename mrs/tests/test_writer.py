@@ -0,0 +1,177 @@
+""" Checks the write-behind persistence of the timetables (see TimetableWriter) against a fake store
+that records the writes and can fail or hold them
+
+Run with: python -m unittest mrs.tests.test_writer
+"""
+import threading
+import unittest
+from unittest import mock
+
+from mrs.db.models.timetable import Timetable as TimetableMongo, from_keyed_graph
+from mrs.tests.test_insertion import create_timetable, get_graph
+from mrs.tests.test_stp import create_stn_task
+from mrs.timetable.writer import TimetableWriter
+
+
+class FakeStore:
+    def __init__(self):
+        """ Stores the timetable documents in memory, in place of TimetableMongo.save and
+        TimetableMongo.update_fields
+
+        The writes whose index is in failures fail. While release is not set, writes block
+        """
+        self.documents = dict()
+        self.writes = list()
+        self.failures = set()
+        self.release = threading.Event()
+        self.release.set()
+        self.writing = threading.Event()
+
+    def write(self, write_type):
+        self.writing.set()
+        self.release.wait()
+        saved = len(self.writes) not in self.failures
+        self.writes.append((write_type, saved))
+        return saved
+
+    def save(self, model):
+        if not self.write('checkpoint'):
+            return False
+        document = model.to_son().to_dict()
+        self.documents[document.pop('_id')] = document
+        return True
+
+    def update_fields(self, robot_id, set_fields, unset_fields):
+        if not self.write('update') or robot_id not in self.documents:
+            return False
+        for path, value in set_fields.items():
+            *keys, last_key = path.split('.')
+            self.get_field(robot_id, keys)[last_key] = value
+        for path in unset_fields:
+            *keys, last_key = path.split('.')
+            self.get_field(robot_id, keys).pop(last_key, None)
+        return True
+
+    def get_field(self, robot_id, keys):
+        field = self.documents[robot_id]
+        for key in keys:
+            field = field.setdefault(key, dict())
+        return field
+
+    def get_write_types(self):
+        return [write_type for write_type, saved in self.writes if saved]
+
+
+class TestTimetableWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.store = FakeStore()
+        patches = [mock.patch.object(TimetableMongo, 'save', lambda model: self.store.save(model)),
+                   mock.patch.object(TimetableMongo, 'update_fields', self.store.update_fields)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.r_earliest_pickup_time = 100
+        self.timetable = create_timetable('fpc', [create_stn_task(self.r_earliest_pickup_time, 20, 5, 10)])
+
+    def tearDown(self):
+        self.store.release.set()
+
+    def create_writer(self, **kwargs):
+        writer = TimetableWriter(**kwargs)
+        self.timetable.writer = writer
+        self.addCleanup(writer.shutdown)
+        return writer
+
+    def add_task(self):
+        self.r_earliest_pickup_time += 100
+        stn_task = create_stn_task(self.r_earliest_pickup_time, 20, 5, 10)
+        self.timetable.insert_task(stn_task, len(self.timetable.stn_tasks) + 1)
+        self.timetable.add_stn_task(stn_task)
+        self.timetable.dispatchable_graph = self.timetable.compute_dispatchable_graph(self.timetable.stn)
+        self.timetable.store()
+
+    def assert_stored(self):
+        document = self.store.documents[self.timetable.robot_id]
+        stn = self.timetable.stn.from_dict(from_keyed_graph(document['stn']))
+        dispatchable_graph = self.timetable.stn.from_dict(from_keyed_graph(document['dispatchable_graph']))
+        self.assertEqual(get_graph(self.timetable.stn), get_graph(stn))
+        self.assertEqual(get_graph(self.timetable.dispatchable_graph), get_graph(dispatchable_graph))
+        self.assertEqual({task_id: task.to_dict() for task_id, task in self.timetable.stn_tasks.items()},
+                         document['stn_tasks'])
+
+    def hold_writes(self, writer):
+        """ Flushes the timetable and holds the background writer in its first write """
+        self.store.release.clear()
+        self.store.writing.clear()
+        writer.flush()
+        self.assertTrue(self.store.writing.wait(5))
+
+    def test_coalescing(self):
+        writer = self.create_writer(write_behind=True)
+        for _ in range(3):
+            self.add_task()
+        self.assertEqual([], self.store.writes)
+
+        writer.flush(wait=True)
+        self.assertEqual(['checkpoint'], self.store.get_write_types())
+        self.assert_stored()
+        self.assertEqual(3, writer.get_stats()['stores'])
+        self.assertEqual(1, writer.get_stats()['serializations'])
+
+    def test_checkpoint_replaces_updates(self):
+        writer = self.create_writer(write_behind=True, delta_persistence=True, checkpoint_interval=2)
+        self.timetable.store()
+        self.hold_writes(writer)
+
+        # Two updates and a checkpoint are queued while the first checkpoint is being written
+        for _ in range(3):
+            self.add_task()
+            writer.flush()
+
+        self.store.release.set()
+        writer.flush(wait=True)
+        self.assertEqual(['checkpoint', 'checkpoint'], self.store.get_write_types())
+        self.assert_stored()
+
+    def test_failed_update(self):
+        writer = self.create_writer(delta_persistence=True)
+        self.timetable.store()
+        self.add_task()
+        self.assertEqual(['checkpoint', 'update'], self.store.get_write_types())
+
+        self.store.failures.add(len(self.store.writes))
+        self.add_task()
+        self.assertEqual(1, writer.get_stats()['failed_writes'])
+
+        # The update was lost, the next write stores the whole timetable
+        self.add_task()
+        self.assertEqual(['checkpoint', 'update', 'checkpoint'], self.store.get_write_types())
+        self.assert_stored()
+
+    def test_failed_write_behind(self):
+        writer = self.create_writer(write_behind=True, delta_persistence=True)
+        self.timetable.store()
+        self.hold_writes(writer)
+
+        # The first update fails, the second one is queued behind it and is saved as a checkpoint
+        self.store.failures.add(1)
+        for _ in range(2):
+            self.add_task()
+            writer.flush()
+        self.store.release.set()
+        writer.flush(wait=True)
+        self.assertEqual([('checkpoint', True), ('update', False), ('checkpoint', True)], self.store.writes)
+        self.assert_stored()
+
+        # Nothing is lost on shutdown and, since the deltas were reset, the last write is a checkpoint
+        self.add_task()
+        writer.shutdown()
+        self.assertEqual(['checkpoint', 'checkpoint', 'checkpoint'], self.store.get_write_types())
+        self.assert_stored()
+        self.assertEqual(1, writer.get_stats()['failed_writes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import logging
+import threading
+
+from mrs.db.models.timetable import Timetable as TimetableMongo
+
+""" Delta persistence of the timetables: only the fields that changed since the last store are written
+"""
+
+
+def get_delta(old, new, path=''):
+    """ Compares two documents and returns the paths whose values changed
+
+    Dicts are compared field by field, any other value (including lists) is compared as a whole
+
+    Returns:
+        dict: new value of each changed or added path
+        list: removed paths
+    """
+    set_fields = dict()
+    unset_fields = list()
+    for key, value in new.items():
+        key_path = path + str(key)
+        if key not in old:
+            set_fields[key_path] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            set_subfields, unset_subfields = get_delta(old[key], value, key_path + '.')
+            set_fields.update(set_subfields)
+            unset_fields.extend(unset_subfields)
+        elif value != old[key]:
+            set_fields[key_path] = value
+
+    unset_fields.extend(path + str(key) for key in old if key not in new)
+    return set_fields, unset_fields
+
+
+class TimetableUpdate:
+    def __init__(self, robot_id, set_fields, unset_fields, document):
+        """ Field-level update of the timetable of robot_id (see TimetableMongo.update_fields)
+
+        Args:
+            document (dict): document of the timetable after the update, used to store the timetable
+                             as a checkpoint if a previous write of the timetable failed
+        """
+        self.robot_id = robot_id
+        self.set_fields = set_fields
+        self.unset_fields = unset_fields
+        self.document = document
+
+    def save(self):
+        """ Returns False if the update could not be applied """
+        return TimetableMongo.update_fields(self.robot_id, self.set_fields, self.unset_fields)
+
+    def to_checkpoint(self):
+        return TimetableMongo.from_document(dict(self.document, _id=self.robot_id))
+
+    def __len__(self):
+        return len(self.set_fields) + len(self.unset_fields)
+
+
+class TimetableDeltas:
+    def __init__(self, checkpoint_interval=100):
+        """ Keeps the last document stored per timetable and turns the next stores into field-level updates
+
+        The graphs are stored keyed (see to_keyed_graph), so an execution update writes the nodes and links
+        it changed instead of the whole timetable. Every checkpoint_interval updates, and whenever the document
+        in the db is unknown (first store, failed write), the whole timetable is saved (checkpoint).
+
+        Updates are computed against the last serialized document, which may still be waiting to be saved.
+        If a write fails (the db cannot be reached, or the document to update is not there), the writer calls
+        reset, so that the next store is a checkpoint, and stores the updates already queued as checkpoints.
+        The stored document is thus the last checkpoint with the updates saved after it applied to it,
+        Timetable.fetch rebuilds the graphs from it with from_keyed_graph
+
+        Args:
+            checkpoint_interval (int): max number of field-level updates between two checkpoints
+        """
+        self.logger = logging.getLogger('mrs.timetable.deltas')
+        self.checkpoint_interval = checkpoint_interval
+        self._documents = dict()
+        self._n_updates = dict()
+        self._lock = threading.Lock()
+
+    def get_write(self, timetable):
+        """ Returns the write that stores the timetable:
+        a TimetableMongo (checkpoint), a TimetableUpdate or None if the timetable did not change
+        """
+        robot_id = timetable.robot_id
+        model = timetable.to_model(keyed_graphs=True)
+        document = model.to_son().to_dict()
+        document.pop('_id', None)
+
+        with self._lock:
+            stored_document = self._documents.get(robot_id)
+            self._documents[robot_id] = document
+
+            if stored_document is None or self._n_updates.get(robot_id, 0) >= self.checkpoint_interval:
+                self.logger.debug("Checkpoint of timetable %s", robot_id)
+                self._n_updates[robot_id] = 0
+                return model
+
+            update = TimetableUpdate(robot_id, *get_delta(stored_document, document), document)
+            if not update:
+                return
+            self._n_updates[robot_id] += 1
+            return update
+
+    def reset(self, robot_id):
+        """ Forgets the last document of robot_id, so that its next store is a checkpoint.
+        Called when a write of the timetable failed
+        """
+        with self._lock:
+            self._documents.pop(robot_id, None)
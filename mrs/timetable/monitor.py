@@ -13,6 +13,8 @@ from mrs.exceptions.execution import EmptyTimetable
 from mrs.messages.remove_task import RemoveTaskFromSchedule
 from mrs.messages.task_status import TaskStatus, TaskProgress
 from mrs.simulation.simulator import SimulatorInterface
+from mrs.timetable.writer import flushes_timetables
+from mrs.utils.event_loop import wakes_up_event_loop
 from mrs.utils.time import relative_to_ztp
 
 
@@ -22,6 +24,8 @@ class TimetableMonitorBase:
         self.timetable = kwargs.get("timetable")
         self.d_graph_watchdog = kwargs.get("d_graph_watchdog", False)
         self.api = kwargs.get('api')
+        self.event_loop = kwargs.get('event_loop')
+        self.timetable_writer = kwargs.get('timetable_writer')
         self.logger = logging.getLogger("mrs.timetable.monitor")
 
     def configure(self, **kwargs):
@@ -35,6 +39,7 @@ class TimetableMonitorBase:
         elif self.timetable:
             return self.timetable
 
+    @flushes_timetables
     def task_status_cb(self, msg):
         payload = msg['payload']
         timestamp = TimeStamp.from_str(msg["header"]["timestamp"]).to_datetime()
@@ -194,12 +199,12 @@ class TimetableMonitorBase:
     def _remove_first_task(task, next_task, status, timetable):
         if status == TaskStatusConst.COMPLETED:
             earliest_time = timetable.stn.get_time(task.task_id, 'delivery', False)
-            timetable.stn.assign_earliest_time(earliest_time, next_task.task_id, 'start', force=True)
+            timetable.assign_earliest_time(earliest_time, next_task.task_id, 'start')
         else:
             nodes = timetable.stn.get_nodes_by_task(task.task_id)
             node_id, node = nodes[0]
             earliest_time = timetable.stn.get_node_earliest_time(node_id)
-            timetable.stn.assign_earliest_time(earliest_time, next_task.task_id, 'start', force=True)
+            timetable.assign_earliest_time(earliest_time, next_task.task_id, 'start')
 
         start_next_task = timetable.dispatchable_graph.get_time(next_task.task_id, 'start')
         if start_next_task < earliest_time:
@@ -242,6 +247,7 @@ class TimetableMonitor(TimetableMonitorBase):
         self.processing_task = False
         self.logger = logging.getLogger("mrs.timetable.monitor")
 
+    @wakes_up_event_loop
     def task_status_cb(self, msg):
         while self.deleting_task:
             time.sleep(0.1)
@@ -373,6 +379,7 @@ class TimetableMonitorProxy(TimetableMonitorBase):
         if self.robot_id == task_status.robot_id:
             super().process_task_status(task_status, timestamp)
 
+    @flushes_timetables
     def remove_task_cb(self, msg):
         payload = msg['payload']
         remove_task = RemoveTaskFromSchedule.from_payload(payload)
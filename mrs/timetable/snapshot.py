@@ -0,0 +1,40 @@
+import copy
+
+
+class STNSnapshot:
+    def __init__(self, stn, allocation_info):
+        """ Lazy copy of an stn with the task of allocation_info inserted in its insertion point
+
+        Taking the snapshot does not copy the stn. The copy is made the first time the snapshot is read
+        or before the stn is modified in place (see Timetable.materialize_snapshots), whichever happens first.
+        Tentative insertions (try_insertion followed by rollback_insertion) leave the stn unchanged,
+        so they do not trigger the copy
+
+        Args:
+            stn (STN): stn without the task
+            allocation_info (AllocationInfo): insertion point, stn task of the task and
+                                              new version of the stn task of the next task (if any)
+        """
+        self._base_stn = stn
+        self.insertion_point = allocation_info.insertion_point
+        self.new_task = allocation_info.new_task
+        self.next_task = allocation_info.next_task
+        self._stn = None
+
+    @property
+    def materialized(self):
+        return self._stn is not None
+
+    def shares(self, stn):
+        """ Returns True if the snapshot has not been copied yet and is based on stn """
+        return not self.materialized and self._base_stn is stn
+
+    def materialize(self):
+        if self._stn is None:
+            stn = copy.deepcopy(self._base_stn)
+            stn.add_task(self.new_task, self.insertion_point)
+            if self.next_task:
+                stn.update_task(self.next_task)
+            self._stn = stn
+            self._base_stn = None
+        return self._stn
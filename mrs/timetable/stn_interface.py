@@ -1,3 +1,4 @@
+import collections
 import uuid
 
 from fmlib.models.tasks import TransportationTask as Task
@@ -30,12 +31,123 @@ class STNInterface:
     def update_task(self, stn_task):
         self.stn.update_task(stn_task)
 
-    def to_stn_task(self, task, travel_duration, insertion_point, earliest_admissible_time):
+    def try_insertion(self, stn_task, insertion_point, next_stn_task=None):
+        """ Tentatively inserts stn_task in the stn, in place (without copying the stn).
+        If given, next_stn_task replaces the version of the task that follows the insertion point.
+
+        The insertion must be undone with ``rollback_insertion``
+
+        Returns:
+            bool: False if propagating the bounds of the inserted nodes proves the stn inconsistent,
+                  True otherwise (the stn still needs to be solved to know whether it is consistent)
+        """
+        self.insert_task(stn_task, insertion_point)
+        sources = list(self.stn.get_task_node_ids(stn_task.task_id))
+        if next_stn_task is not None:
+            self.update_task(next_stn_task)
+            sources.extend(self.stn.get_task_node_ids(next_stn_task.task_id))
+        return self.propagate_bounds(sources)
+
+    def rollback_insertion(self, insertion_point, prev_version_next_stn_task=None):
+        """ Undoes a ``try_insertion`` in place """
+        self.stn.remove_task(insertion_point)
+        if prev_version_next_stn_task is not None:
+            self.update_task(prev_version_next_stn_task)
+
+    def propagate_bounds(self, sources):
+        """ Propagates the earliest and latest times of the source nodes through the edges of the stn,
+        visiting only the nodes whose bounds change.
+
+        The propagated bounds are implied by the constraints of the stn, so finding a node whose earliest
+        time is greater than its latest time (or a negative cycle) proves that the stn has no solution.
+        The converse does not hold, i.e., a True answer does not replace solving the stn.
+
+        Args:
+            sources (list): node ids from which the propagation starts
+
+        Returns:
+            bool: False if the stn is inconsistent, True otherwise
+        """
+        return self._propagate(sources) is not None
+
+    def compute_bounds(self):
+        """ Propagates the bounds of all nodes in the stn. The result is the earliest and latest time
+        of each node in the minimal network of the stn
+
+        Returns:
+            tuple: (earliest, latest) dicts of relative times per node id, or None if the stn is inconsistent
+        """
+        return self._propagate([node_id for node_id in self.stn.nodes() if node_id != 0])
+
+    def _propagate(self, sources):
+        earliest = dict()
+        latest = dict()
+        n_visits = collections.Counter()
+        max_visits = self.stn.number_of_nodes()
+
+        queue = collections.deque()
+        for node_id in sources:
+            queue.append(node_id)
+            # The neighbours of the sources push their bounds into the sources
+            queue.extend(self.stn.predecessors(node_id))
+            queue.extend(self.stn.successors(node_id))
+        queued = set(queue)
+
+        while queue:
+            node_id = queue.popleft()
+            queued.discard(node_id)
+            if node_id == 0:
+                continue
+            n_visits[node_id] += 1
+            if n_visits[node_id] > max_visits:
+                # Negative cycle
+                return
+
+            node_earliest = self._get_bound(earliest, node_id, lower_bound=True)
+            node_latest = self._get_bound(latest, node_id, lower_bound=False)
+
+            # Edge (i, j) with weight w encodes t_j - t_i <= w
+            for next_node_id in self.stn.successors(node_id):
+                if next_node_id == 0:
+                    continue
+                weight = self.stn[node_id][next_node_id]['weight']
+                if node_latest + weight < self._get_bound(latest, next_node_id, lower_bound=False):
+                    latest[next_node_id] = node_latest + weight
+                    if next_node_id not in queued:
+                        queue.append(next_node_id)
+                        queued.add(next_node_id)
+
+            for prev_node_id in self.stn.predecessors(node_id):
+                if prev_node_id == 0:
+                    continue
+                weight = self.stn[prev_node_id][node_id]['weight']
+                if node_earliest - weight > self._get_bound(earliest, prev_node_id, lower_bound=True):
+                    earliest[prev_node_id] = node_earliest - weight
+                    if prev_node_id not in queued:
+                        queue.append(prev_node_id)
+                        queued.add(prev_node_id)
+
+            if self._get_bound(earliest, node_id, lower_bound=True) > \
+                    self._get_bound(latest, node_id, lower_bound=False):
+                return
+
+        return earliest, latest
+
+    def _get_bound(self, bounds, node_id, lower_bound=True):
+        if node_id not in bounds:
+            if lower_bound:
+                bounds[node_id] = self.stn.get_node_earliest_time(node_id)
+            else:
+                bounds[node_id] = self.stn.get_node_latest_time(node_id)
+        return bounds[node_id]
+
+    def to_stn_task(self, task, travel_duration, insertion_point, earliest_admissible_time, **kwargs):
         travel_edge = Edge(name="travel_time", mean=travel_duration.mean, variance=travel_duration.variance)
         duration_edge = Edge(name="work_time", mean=task.duration.mean, variance=task.duration.variance)
 
         pickup_timepoint = self.get_pickup_timepoint(task, travel_edge, insertion_point)
-        start_timepoint = self.get_start_timepoint(pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time)
+        start_timepoint = self.get_start_timepoint(pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time,
+                                                   **kwargs)
         delivery_timepoint = self.get_delivery_timepoint(pickup_timepoint, duration_edge)
 
         edges = [travel_edge, duration_edge]
@@ -46,21 +158,22 @@ class STNInterface:
         stn_task = STNTask(task.task_id, timepoints, edges, pickup_action_id, delivery_action_id)
         return stn_task
 
-    def update_stn_task(self, stn_task, travel_duration, insertion_point, earliest_admissible_time):
+    def update_stn_task(self, stn_task, travel_duration, insertion_point, earliest_admissible_time, **kwargs):
         travel_edge = Edge(name="travel_time", mean=travel_duration.mean, variance=travel_duration.variance)
         pickup_timepoint = stn_task.get_timepoint("pickup")
-        start_timepoint = self.get_start_timepoint(pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time)
+        start_timepoint = self.get_start_timepoint(pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time,
+                                                   **kwargs)
         stn_task.update_timepoint("start", start_timepoint.r_earliest_time, start_timepoint.r_latest_time)
         return stn_task
 
-    def get_start_timepoint(self, pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time):
+    def get_start_timepoint(self, pickup_timepoint, travel_edge, insertion_point, earliest_admissible_time, **kwargs):
         start_timepoint = self.stn.get_prev_timepoint("start", pickup_timepoint, travel_edge)
 
         if insertion_point == 1:
             r_earliest_admissible_time = relative_to_ztp(self.ztp, earliest_admissible_time.to_datetime())
             start_timepoint.r_earliest_time = max(r_earliest_admissible_time, start_timepoint.r_earliest_time)
 
-        if insertion_point > 1 and self.previous_task_is_frozen(insertion_point):
+        if insertion_point > 1 and self.previous_task_is_frozen(insertion_point, **kwargs):
             r_latest_delivery_time_previous_task = self.get_r_time_previous_task(insertion_point, "delivery", earliest=False)
             start_timepoint.r_earliest_time = max(start_timepoint.r_earliest_time, r_latest_delivery_time_previous_task)
         return start_timepoint
@@ -89,7 +202,14 @@ class STNInterface:
         delivery_timepoint = self.stn.get_next_timepoint("delivery", pickup_timepoint, duration_edge)
         return delivery_timepoint
 
-    def previous_task_is_frozen(self, insertion_point):
+    def previous_task_is_frozen(self, insertion_point, **kwargs):
+        """ Returns True if the task previous to the insertion point was dispatched or is ongoing.
+        The status is read from the bidding_context (kwarg), if given, instead of the db
+        """
+        bidding_context = kwargs.get('bidding_context')
+        if bidding_context:
+            return bidding_context.is_frozen(insertion_point-1)
+
         task_id = self.stn.get_task_id(insertion_point-1)
         previous_task = Task.get_task(task_id)
         if previous_task.status.status in [TaskStatusConst.DISPATCHED, TaskStatusConst.ONGOING]:
@@ -98,5 +218,4 @@ class STNInterface:
 
     def get_r_time_previous_task(self, insertion_point, node_type, earliest=True):
         task_id = self.stn.get_task_id(insertion_point-1)
-        previous_task = Task.get_task(task_id)
-        return self.dispatchable_graph.get_time(previous_task.task_id, node_type, earliest)
+        return self.dispatchable_graph.get_time(task_id, node_type, earliest)
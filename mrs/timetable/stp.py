@@ -0,0 +1,125 @@
+import copy
+import logging
+
+from stn.exceptions.stp import NoSTPSolution
+from stn.stp import STP
+
+""" STP solvers of the timetables
+"""
+
+INF = float('inf')
+
+
+def get_stp_solver(solver_name):
+    """ Returns the stp solver with the given name: 'chain' (see ChainSTP) or any solver of the stn package
+    """
+    if solver_name == ChainSTP.solver_name:
+        return ChainSTP()
+    return STP(solver_name)
+
+
+def get_chain_shortest_paths(stn):
+    """ Computes the shortest paths of the edges of stn, if stn is a chain, i.e., if its edges connect
+    consecutive nodes or a node with the zero timepoint (node 0)
+
+    In a chain, the shortest path from the zero timepoint to a node goes forward or backward along the chain
+    from the node where it leaves the zero timepoint, so one forward and one backward pass compute
+    the latest time (and, symmetrically, the earliest time) of all nodes in O(n)
+
+    Returns:
+        dict: shortest path per edge (i, j) of stn, None if stn is not a chain
+        bool: False if stn is inconsistent
+    """
+    node_ids = sorted(node_id for node_id in stn.nodes() if node_id != 0)
+    position = {node_id: k for k, node_id in enumerate(node_ids)}
+    n_nodes = len(node_ids)
+
+    # Edges from and to the zero timepoint and between consecutive nodes (forward and backward)
+    from_ztp = [INF] * n_nodes
+    to_ztp = [INF] * n_nodes
+    forward = [INF] * n_nodes
+    backward = [INF] * n_nodes
+    edges = list(stn.edges(data='weight'))
+
+    for i, j, weight in edges:
+        if i == 0 and j != 0:
+            from_ztp[position[j]] = min(from_ztp[position[j]], weight)
+        elif j == 0 and i != 0:
+            to_ztp[position[i]] = min(to_ztp[position[i]], weight)
+        elif i != 0 and position[j] == position[i] + 1:
+            forward[position[i]] = min(forward[position[i]], weight)
+        elif i != 0 and position[j] == position[i] - 1:
+            backward[position[j]] = min(backward[position[j]], weight)
+        else:
+            return None, True
+
+    if any(forward[k] + backward[k] < 0 for k in range(n_nodes - 1)):
+        return {}, False
+
+    # latest[k]: shortest path from the zero timepoint to node k
+    latest = list(from_ztp)
+    for k in range(1, n_nodes):
+        latest[k] = min(latest[k], latest[k-1] + forward[k-1])
+    for k in range(n_nodes - 2, -1, -1):
+        latest[k] = min(latest[k], latest[k+1] + backward[k])
+
+    # neg_earliest[k]: shortest path from node k to the zero timepoint
+    neg_earliest = list(to_ztp)
+    for k in range(n_nodes - 2, -1, -1):
+        neg_earliest[k] = min(neg_earliest[k], forward[k] + neg_earliest[k+1])
+    for k in range(1, n_nodes):
+        neg_earliest[k] = min(neg_earliest[k], backward[k-1] + neg_earliest[k-1])
+
+    if any(latest[k] + neg_earliest[k] < 0 for k in range(n_nodes)):
+        return {}, False
+
+    shortest_paths = dict()
+    for i, j, weight in edges:
+        if i == 0:
+            shortest_paths[(i, j)] = latest[position[j]]
+        elif j == 0:
+            shortest_paths[(i, j)] = neg_earliest[position[i]]
+        else:
+            # Directly or through the zero timepoint
+            shortest_paths[(i, j)] = min(weight, neg_earliest[position[i]] + latest[position[j]])
+    return shortest_paths, True
+
+
+class ChainSTP:
+    solver_name = 'chain'
+
+    def __init__(self):
+        """ Solver of the stns of the timetables, which are chains of tasks: their edges connect consecutive
+        timepoints or a timepoint with the zero timepoint
+
+        Chains are solved in O(n) (see get_chain_shortest_paths). The dispatchable graph has the same edge weights
+        and risk metric as the one computed by fpc. Stns that are not chains are solved by fpc
+        """
+        self.logger = logging.getLogger('mrs.timetable.stp')
+        self.fpc = STP('fpc')
+
+    def get_stn(self, **kwargs):
+        return self.fpc.get_stn(**kwargs)
+
+    def solve(self, stn, **kwargs):
+        """ Returns the dispatchable graph of stn. Raises NoSTPSolution if stn is inconsistent
+        """
+        shortest_paths, is_consistent = get_chain_shortest_paths(stn)
+        if shortest_paths is None:
+            self.logger.debug("The stn is not a chain, solving it with fpc")
+            return self.fpc.solve(stn, **kwargs)
+        if not is_consistent:
+            raise NoSTPSolution()
+
+        dispatchable_graph = copy.deepcopy(stn)
+        for (i, j), weight in shortest_paths.items():
+            dispatchable_graph[i][j]['weight'] = weight
+        # Risk metric of the dispatchable graphs computed by fpc
+        dispatchable_graph.risk_metric = 1
+        return dispatchable_graph
+
+    def is_consistent(self, stn):
+        shortest_paths, is_consistent = get_chain_shortest_paths(stn)
+        if shortest_paths is None:
+            return self.fpc.is_consistent(stn)
+        return is_consistent
@@ -1,24 +1,25 @@
-import copy
+import bisect
 import logging
+import weakref
 from datetime import timedelta
 
 from fmlib.models.tasks import TransportationTask as Task, TimepointConstraint
-from stn.stp import STP
 
-from mrs.db.models.timetable import Timetable as TimetableMongo
+from mrs.db.models.timetable import Timetable as TimetableMongo, to_keyed_graph, from_keyed_graph
 from mrs.exceptions.allocation import InvalidAllocation
 from mrs.exceptions.allocation import TaskNotFound
 from mrs.exceptions.execution import InconsistentAssignment
 from mrs.messages.d_graph_update import DGraphUpdate
 from mrs.simulation.simulator import SimulatorInterface
+from mrs.timetable.snapshot import STNSnapshot
 from mrs.timetable.stn_interface import STNInterface
+from mrs.timetable.stp import get_stp_solver
 from pymodm.errors import DoesNotExist
 from ropod.utils.timestamp import TimeStamp
 from stn.exceptions.stp import NoSTPSolution
-from stn.methods.fpc import get_minimal_network
 from stn.task import Task as STNTask
 
-from mrs.utils.time import to_timestamp
+from mrs.utils.time import relative_to_ztp, to_timestamp
 
 
 class Timetable(STNInterface):
@@ -32,12 +33,18 @@ class Timetable(STNInterface):
                             shrinks the original temporal constraints to the times at which the robot
                             can allocate the task
 
+    - version (int): Increases every time the timetable changes
+
     """
 
     def __init__(self, robot_id, stp_solver, **kwargs):
 
+        self.version = 0
         self.robot_id = robot_id
         self.stp_solver = stp_solver
+        self.writer = kwargs.get('timetable_writer')
+        # Snapshots that have not been copied yet
+        self._snapshots = weakref.WeakSet()
 
         simulator_interface = SimulatorInterface(kwargs.get("simulator"))
 
@@ -49,8 +56,53 @@ class Timetable(STNInterface):
         self.logger = logging.getLogger("mrs.timetable.%s" % self.robot_id)
         self.logger.debug("Timetable %s started", self.robot_id)
 
+    @property
+    def stn(self):
+        return self._stn
+
+    @stn.setter
+    def stn(self, stn):
+        self._stn = stn
+        self.version += 1
+
+    @property
+    def dispatchable_graph(self):
+        return self._dispatchable_graph
+
+    @dispatchable_graph.setter
+    def dispatchable_graph(self, dispatchable_graph):
+        self._dispatchable_graph = dispatchable_graph
+        self.version += 1
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_snapshots', None)
+        state.pop('writer', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._snapshots = weakref.WeakSet()
+        self.writer = None
+
+    def get_snapshot(self, allocation_info):
+        """ Returns a lazy copy of the stn with the task of allocation_info inserted (see STNSnapshot)
+        """
+        snapshot = STNSnapshot(self.stn, allocation_info)
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def materialize_snapshots(self):
+        """ Copies the snapshots based on the current stn. Called before modifying the stn in place
+        """
+        for snapshot in list(self._snapshots):
+            if snapshot.shares(self.stn):
+                snapshot.materialize()
+            self._snapshots.discard(snapshot)
+
     def update_ztp(self, time_):
         self.ztp.timestamp = time_
+        self.version += 1
         self.logger.debug("Zero timepoint updated to: %s", self.ztp)
 
     def compute_dispatchable_graph(self, stn):
@@ -61,12 +113,16 @@ class Timetable(STNInterface):
             raise NoSTPSolution()
 
     def assign_timepoint(self, assigned_time, node_id):
-        stn = copy.deepcopy(self.stn)
-        minimal_network = get_minimal_network(stn)
-        if minimal_network:
-            minimal_network.assign_timepoint(assigned_time, node_id, force=True)
-            if self.stp_solver.is_consistent(minimal_network):
+        # The bounds of the node in the minimal network are the times it can be assigned
+        # without making the stn inconsistent
+        bounds = self.compute_bounds()
+        if bounds is not None:
+            earliest, latest = bounds
+            if self._get_bound(earliest, node_id) <= assigned_time <= \
+                    self._get_bound(latest, node_id, lower_bound=False):
+                self.materialize_snapshots()
                 self.stn.assign_timepoint(assigned_time, node_id, force=True)
+                self.version += 1
                 return
         node = self.stn.get_node(node_id)
         raise InconsistentAssignment(assigned_time, node.task_id, node.node_type)
@@ -84,16 +140,20 @@ class Timetable(STNInterface):
         return False
 
     def update_timepoint(self, assigned_time, node_id):
+        self.materialize_snapshots()
         self.stn.assign_timepoint(assigned_time, node_id, force=True)
         self.stn.execute_timepoint(node_id)
         self.dispatchable_graph.assign_timepoint(assigned_time, node_id, force=True)
         self.dispatchable_graph.execute_timepoint(node_id)
+        self.version += 1
 
     def execute_edge(self, start_node_id, finish_node_id):
+        self.materialize_snapshots()
         self.stn.execute_edge(start_node_id, finish_node_id)
         self.stn.remove_old_timepoints()
         self.dispatchable_graph.execute_edge(start_node_id, finish_node_id)
         self.dispatchable_graph.remove_old_timepoints()
+        self.version += 1
 
     def get_tasks(self):
         """ Returns the tasks contained in the timetable
@@ -121,6 +181,92 @@ class Timetable(STNInterface):
     def get_task_node_ids(self, task_id):
         return self.stn.get_task_node_ids(task_id)
 
+    def get_insertion_bounds(self):
+        """ Returns, per position in the timetable, a lower bound of the delivery time and an upper bound
+        of the pickup time of the task in that position that remain valid after inserting a task.
+
+        - The earliest delivery time of the task in position k only depends on the tasks in positions <= k,
+        which do not change when a task is inserted after k.
+        - The pickup time of the task in position k is bounded by its pickup window and by the latest pickup
+        time of the task in position k+1 (which only depends on the tasks in positions >= k+1).
+        The start constraints of the task in position k are not used because they change when a task
+        is inserted before it.
+
+        Both lists are monotonic, so they can be binary searched.
+
+        Returns:
+            tuple: (earliest_deliveries, latest_pickups) lists of relative times, where the element i
+                   corresponds to position i+1. None if the stn is inconsistent
+        """
+        bounds = self.compute_bounds()
+        if bounds is None:
+            return
+        earliest, latest = bounds
+
+        n_tasks = len(self.get_tasks())
+        earliest_deliveries = list()
+        latest_pickups = list()
+        minimal_latest_pickups = list()
+
+        for position in range(1, n_tasks+1):
+            task_id = self.stn.get_task_id(position)
+            node_ids = self.stn.get_task_node_ids(task_id)
+
+            # Nodes of executed timepoints are removed from the stn, the delivery node is the last one
+            earliest_delivery = max(earliest[node_id] for node_id in node_ids)
+            if earliest_deliveries:
+                earliest_delivery = max(earliest_delivery, earliest_deliveries[-1])
+            earliest_deliveries.append(earliest_delivery)
+
+            pickup_node_ids = [node_id for node_id in node_ids if self.stn.get_node(node_id).node_type == "pickup"]
+            if pickup_node_ids:
+                # The pickup window that the stn task of the task will have after the insertion
+                latest_pickup = self.stn.get_node_latest_time(pickup_node_ids[0])
+                stn_task = self.get_stn_task(task_id)
+                if stn_task:
+                    latest_pickup = max(latest_pickup, stn_task.get_timepoint("pickup").r_latest_time)
+                latest_pickups.append(latest_pickup)
+                minimal_latest_pickups.append(latest[pickup_node_ids[0]])
+            else:
+                latest_pickups.append(float('inf'))
+                minimal_latest_pickups.append(float('inf'))
+
+        for i in reversed(range(n_tasks-1)):
+            latest_pickups[i] = min(latest_pickups[i], minimal_latest_pickups[i+1], latest_pickups[i+1])
+
+        return earliest_deliveries, latest_pickups
+
+    def get_insertion_points(self, task, insertion_bounds=None, first_insertion_point=1):
+        """ Returns the range of insertion points where the task could be inserted without making the stn
+        inconsistent. The insertion points outside the range are infeasible because:
+
+        - the earliest delivery time of the previous task is after the latest pickup time of the task, or
+        - the earliest pickup time of the task is after the latest pickup time of the next task.
+
+        Args:
+            task (Task): task to insert
+            insertion_bounds (tuple): output of get_insertion_bounds
+            first_insertion_point (int): first insertion point to consider
+
+        Returns:
+            range: insertion points
+        """
+        n_tasks = len(self.get_tasks())
+        if insertion_bounds is None or not task.hard_constraints:
+            # The pickup window of tasks with soft constraints depends on the insertion point
+            return range(first_insertion_point, n_tasks+2)
+
+        earliest_deliveries, latest_pickups = insertion_bounds
+        r_earliest_pickup_time = relative_to_ztp(self.ztp, task.pickup_constraint.earliest_time)
+        r_latest_pickup_time = relative_to_ztp(self.ztp, task.pickup_constraint.latest_time)
+
+        # Positions whose next task has to be picked up before the task
+        first_feasible = bisect.bisect_left(latest_pickups, r_earliest_pickup_time) + 1
+        # Positions whose previous task is delivered after the latest pickup time of the task
+        last_feasible = bisect.bisect_right(earliest_deliveries, r_latest_pickup_time) + 1
+
+        return range(max(first_insertion_point, first_feasible), last_feasible+1)
+
     def get_next_task(self, task):
         task_last_node = self.stn.get_task_node_ids(task.task_id)[-1]
         if self.stn.has_node(task_last_node + 1):
@@ -189,6 +335,7 @@ class Timetable(STNInterface):
             self.stn_tasks.pop(str(task_id))
 
     def remove_task_from_stn(self, task_id):
+        self.materialize_snapshots()
         task_node_ids = self.stn.get_task_node_ids(task_id)
         if 0 < len(task_node_ids) < 3:
             self.stn.remove_node_ids(task_node_ids)
@@ -211,10 +358,15 @@ class Timetable(STNInterface):
         self.store()
 
     def remove_node_ids(self, task_node_ids):
+        self.materialize_snapshots()
         self.stn.remove_node_ids(task_node_ids)
         self.dispatchable_graph.remove_node_ids(task_node_ids)
         self.store()
 
+    def assign_earliest_time(self, earliest_time, task_id, node_type):
+        self.materialize_snapshots()
+        self.stn.assign_earliest_time(earliest_time, task_id, node_type, force=True)
+
     def get_timepoint_constraint(self, task_id, constraint_name):
         earliest_time = to_timestamp(self.ztp,
                                      self.get_r_time(task_id, constraint_name, lower_bound=True)).to_datetime()
@@ -242,7 +394,7 @@ class Timetable(STNInterface):
     @staticmethod
     def from_dict(timetable_dict):
         robot_id = timetable_dict['robot_id']
-        stp_solver = STP(timetable_dict['solver_name'])
+        stp_solver = get_stp_solver(timetable_dict['solver_name'])
         timetable = Timetable(robot_id, stp_solver)
         stn_cls = timetable.stp_solver.get_stn()
 
@@ -254,27 +406,45 @@ class Timetable(STNInterface):
 
         return timetable
 
-    def to_model(self):
+    def to_model(self, keyed_graphs=False):
+        """ Returns the timetable mongo model.
+        With keyed_graphs, the nodes and links of the graphs are stored as dicts (see to_keyed_graph)
+        """
         stn_tasks = {task_id: task.to_dict() for (task_id, task) in self.stn_tasks.items()}
+        stn = self.stn.to_dict()
+        dispatchable_graph = self.dispatchable_graph.to_dict()
+        if keyed_graphs:
+            stn = to_keyed_graph(stn)
+            dispatchable_graph = to_keyed_graph(dispatchable_graph)
 
         timetable_model = TimetableMongo(self.robot_id,
                                          self.stp_solver.solver_name,
                                          self.ztp.to_datetime(),
-                                         self.stn.to_dict(),
-                                         self.dispatchable_graph.to_dict(),
+                                         stn,
+                                         dispatchable_graph,
                                          stn_tasks)
         return timetable_model
 
     def store(self):
-        timetable = self.to_model()
-        timetable.save()
+        if self.writer:
+            self.writer.store(self)
+        else:
+            timetable = self.to_model()
+            timetable.save()
+        self.version += 1
+
+    def flush(self):
+        """ Blocks until the changes of the timetable have been saved (only needed if stores are written behind)
+        """
+        if self.writer:
+            self.writer.flush(wait=True)
 
     def fetch(self):
         try:
             self.logger.debug("Fetching timetable of robot %s", self.robot_id)
             timetable_mongo = TimetableMongo.objects.get_timetable(self.robot_id)
-            self.stn = self.stn.from_dict(timetable_mongo.stn)
-            self.dispatchable_graph = self.stn.from_dict(timetable_mongo.dispatchable_graph)
+            self.stn = self.stn.from_dict(from_keyed_graph(timetable_mongo.stn))
+            self.dispatchable_graph = self.stn.from_dict(from_keyed_graph(timetable_mongo.dispatchable_graph))
             self.ztp = TimeStamp.from_datetime(timetable_mongo.ztp)
             self.stn_tasks = {task_id: STNTask.from_dict(task) for (task_id, task) in timetable_mongo.stn_tasks.items()}
 
@@ -294,6 +464,9 @@ class TimetableManager(dict):
         self.logger = logging.getLogger("mrs.timetable.manager")
         self.stp_solver = stp_solver
         self.simulator = kwargs.get('simulator')
+        self.timetable_writer = kwargs.get('timetable_writer')
+        # Insertion bounds of each robot's timetable, with the timetable and version they were computed for
+        self.insertion_bounds = dict()
 
         self.logger.debug("TimetableManager started")
 
@@ -315,7 +488,8 @@ class TimetableManager(dict):
 
     def register_robot(self, robot_id):
         self.logger.debug("Registering robot %s", robot_id)
-        timetable = Timetable(robot_id, self.stp_solver, simulator=self.simulator)
+        timetable = Timetable(robot_id, self.stp_solver, simulator=self.simulator,
+                              timetable_writer=self.timetable_writer)
         timetable.fetch()
         self[robot_id] = timetable
         timetable.store()
@@ -324,20 +498,58 @@ class TimetableManager(dict):
         for robot_id, timetable in self.items():
             timetable.fetch()
 
+    def get_insertion_bounds(self, robot_id):
+        """ Returns the insertion bounds of the robot's timetable (see Timetable.get_insertion_bounds).
+        The bounds are recomputed only after the timetable changes, i.e., after allocations and execution updates
+        """
+        timetable = self.get(robot_id)
+        key = (id(timetable), timetable.version)
+        cached_key, insertion_bounds = self.insertion_bounds.get(robot_id, (None, None))
+        if cached_key != key:
+            insertion_bounds = timetable.get_insertion_bounds()
+            self.insertion_bounds[robot_id] = (key, insertion_bounds)
+        return insertion_bounds
+
+    def has_capacity(self, robot_id, task):
+        """ Returns False if the pickup window of the task does not overlap any free window of the robot's
+        timetable, i.e., if the task cannot be inserted in any position of the timetable.
+        Travel times are not considered, so a True does not mean that the robot can perform the task
+        """
+        if not task.hard_constraints:
+            # The pickup window of tasks with soft constraints is set when they are announced
+            return True
+        insertion_bounds = self.get_insertion_bounds(robot_id)
+        if insertion_bounds is None:
+            return True
+        return len(self.get(robot_id).get_insertion_points(task, insertion_bounds)) > 0
+
+    def get_robots_with_capacity(self, robot_ids, tasks):
+        """ Returns the robots in robot_ids that have capacity for at least one of the tasks """
+        return [robot_id for robot_id in robot_ids
+                if any(self.has_capacity(robot_id, task) for task in tasks)]
+
     def update_timetable(self, robot_id, allocation_info, task):
         timetable = self.get(robot_id)
-        stn = copy.deepcopy(timetable.stn)
+        timetable.materialize_snapshots()
 
-        stn.add_task(allocation_info.new_task, allocation_info.insertion_point)
+        # The task is inserted in place and removed again if the stn is inconsistent
+        timetable.insert_task(allocation_info.new_task, allocation_info.insertion_point)
         if allocation_info.next_task:
-            stn.update_task(allocation_info.next_task)
+            timetable.update_task(allocation_info.next_task)
 
         try:
-            timetable.dispatchable_graph = timetable.compute_dispatchable_graph(stn)
+            dispatchable_graph = allocation_info.get_attached_dispatchable_graph(timetable.stn)
+            if dispatchable_graph is None:
+                self.logger.debug("Computing dispatchable graph of robot %s", robot_id)
+                dispatchable_graph = timetable.compute_dispatchable_graph(timetable.stn)
+            else:
+                self.logger.debug("Using the dispatchable graph computed by robot %s", robot_id)
+            timetable.dispatchable_graph = dispatchable_graph
 
         except NoSTPSolution:
             self.logger.warning("The STN is inconsistent with task %s in insertion point %s", task.task_id,
                                 allocation_info.insertion_point)
+            timetable.rollback_insertion(allocation_info.insertion_point, allocation_info.prev_version_next_task)
             self.logger.debug("STN robot %s: %s", robot_id, timetable.stn)
             self.logger.debug("Dispatchable graph robot %s: %s", robot_id, timetable.dispatchable_graph)
 
@@ -347,7 +559,8 @@ class TimetableManager(dict):
         if allocation_info.next_task:
             timetable.add_stn_task(allocation_info.next_task)
 
-        timetable.stn = stn
+        # The stn changed in place
+        timetable.version += 1
         self.update({robot_id: timetable})
         timetable.store()
 
@@ -0,0 +1,208 @@
+import functools
+import logging
+import threading
+
+from mrs.timetable.delta import TimetableDeltas, TimetableUpdate
+
+""" Write-behind persistence of the timetables
+"""
+
+
+def flushes_timetables(callback):
+    """ Decorates a message callback of a component so that, once the message has been processed,
+    the timetables it modified are flushed by the component's timetable writer (if any)
+    """
+    @functools.wraps(callback)
+    def wrapper(component, *args, **kwargs):
+        try:
+            return callback(component, *args, **kwargs)
+        finally:
+            timetable_writer = getattr(component, 'timetable_writer', None)
+            if timetable_writer:
+                timetable_writer.flush()
+    return wrapper
+
+
+class TimetableWriter:
+    def __init__(self, write_behind=False, delta_persistence=False, checkpoint_interval=100, **kwargs):
+        """ Stores the timetables in the db
+
+        If write_behind is False, Timetable.store saves the timetable right away.
+        If write_behind is True, Timetable.store only marks the timetable as dirty. Dirty timetables are flushed
+        at most once per loop tick, i.e., at the end of a message callback (see flushes_timetables) or of an
+        iteration of the ccu loop, or at a durability point (e.g. before a robot acknowledges a task contract).
+
+        A timetable is serialized by the thread that modified it, when that thread flushes, so the serialized
+        timetable is consistent. The serialized timetables are saved by a background writer; if a timetable is
+        flushed again before its previous version has been saved, only the latest version is saved.
+
+        If delta_persistence is True, only the fields of a timetable that changed since it was last stored
+        are written (see TimetableDeltas). Updates of a timetable are saved in order; a checkpoint replaces
+        the updates of the timetable that have not been saved yet.
+
+        Args:
+            write_behind (bool): If True, timetables are marked dirty on store and flushed by the background writer
+            delta_persistence (bool): If True, timetables are stored with field-level updates
+            checkpoint_interval (int): max number of field-level updates of a timetable between two full writes
+        """
+        self.logger = logging.getLogger('mrs.timetable.writer')
+        self.write_behind = write_behind
+        self.deltas = TimetableDeltas(checkpoint_interval) if delta_persistence else None
+
+        self.n_stores = 0
+        self.n_flushes = 0
+        self.n_serializations = 0
+        self.n_writes = 0
+        self.n_updates = 0
+        self.n_failed_writes = 0
+        # Robots whose last write failed
+        self._failed = set()
+
+        # Dirty timetables per thread {thread id: {robot_id: timetable}}
+        self._dirty = dict()
+        # Writes waiting to be saved {robot_id: [timetable model or update]}
+        self._pending = dict()
+        self._writing = False
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+        # Timetables are serialized one at a time, so that updates are queued in the order they were computed
+        self._serialization_lock = threading.RLock()
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            self.logger.debug("Adding %s", key)
+            self.__dict__[key] = value
+
+    def store(self, timetable):
+        with self._condition:
+            self.n_stores += 1
+            if self.write_behind:
+                self._dirty.setdefault(threading.get_ident(), dict())[timetable.robot_id] = timetable
+                return
+            self.n_serializations += 1
+        with self._serialization_lock:
+            write = self.get_write(timetable)
+            if write is not None:
+                self.save(write)
+
+    def get_write(self, timetable):
+        """ Serializes the timetable into the write that stores it (None if nothing changed) """
+        if self.deltas:
+            return self.deltas.get_write(timetable)
+        return timetable.to_model()
+
+    def save(self, write):
+        """ Saves a write. Updates of a timetable whose previous write failed are saved as checkpoints,
+        an update on top of a document that is not in the db would corrupt the stored timetable
+        """
+        robot_id = write.robot_id
+        if isinstance(write, TimetableUpdate) and robot_id in self._failed:
+            write = write.to_checkpoint()
+
+        try:
+            saved = write.save() is not False
+        except Exception:
+            self.logger.exception("Error storing timetable of robot %s", robot_id)
+            saved = False
+
+        if saved:
+            self._failed.discard(robot_id)
+        elif self.deltas:
+            self.logger.warning("The timetable of robot %s could not be stored, its next write is a checkpoint",
+                                robot_id)
+            self._failed.add(robot_id)
+            self.deltas.reset(robot_id)
+
+        with self._condition:
+            self.n_writes += 1
+            if not saved:
+                self.n_failed_writes += 1
+            elif isinstance(write, TimetableUpdate):
+                self.n_updates += 1
+
+    def flush(self, wait=False, all_threads=False):
+        """ Serializes the timetables modified by the calling thread since its last flush and hands them
+        to the background writer
+
+        Args:
+            wait (bool): If True, blocks until the timetables have been saved (durability point)
+            all_threads (bool): If True, also flushes the timetables modified by other threads
+        """
+        with self._condition:
+            if all_threads:
+                dirty = dict()
+                for timetables in self._dirty.values():
+                    dirty.update(timetables)
+                self._dirty.clear()
+            else:
+                dirty = self._dirty.pop(threading.get_ident(), dict())
+
+        if dirty:
+            with self._serialization_lock:
+                writes = [self.get_write(timetable) for timetable in dirty.values()]
+                with self._condition:
+                    self.n_flushes += 1
+                    self.n_serializations += len(writes)
+                    for write in writes:
+                        if write is None:
+                            continue
+                        if isinstance(write, TimetableUpdate):
+                            self._pending.setdefault(write.robot_id, list()).append(write)
+                        else:
+                            self._pending[write.robot_id] = [write]
+                    self._start()
+                    self._condition.notify_all()
+
+        if wait:
+            self.wait()
+
+    def wait(self):
+        """ Blocks until the background writer has saved all flushed timetables """
+        with self._condition:
+            while self._running and (self._pending or self._writing):
+                self._condition.wait()
+
+    def _start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._write, name='timetable_writer', daemon=True)
+            self._thread.start()
+
+    def _write(self):
+        while True:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                writes = [write for robot_writes in self._pending.values() for write in robot_writes]
+                self._pending.clear()
+                self._writing = True
+
+            for write in writes:
+                self.save(write)
+
+    def shutdown(self):
+        """ Flushes the timetables modified by any thread and waits until they are saved """
+        self.flush(wait=True, all_threads=True)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+        self.logger.info("Timetable writer stats: %s", self.get_stats())
+
+    def get_stats(self):
+        """ Returns the number of store requests, flushes, serialized timetables, writes, field-level updates
+        and failed writes
+        """
+        with self._condition:
+            return {'stores': self.n_stores,
+                    'flushes': self.n_flushes,
+                    'serializations': self.n_serializations,
+                    'writes': self.n_writes,
+                    'updates': self.n_updates,
+                    'failed_writes': self.n_failed_writes}
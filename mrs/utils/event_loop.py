@@ -0,0 +1,90 @@
+import functools
+import heapq
+import logging
+import threading
+import time
+
+from mrs.simulation.simulator import SimulatorInterface
+
+
+def wakes_up_event_loop(callback):
+    """ Decorates a message callback of a component so that, once the message has been processed,
+    it wakes up the component's event loop (if any)
+    """
+    @functools.wraps(callback)
+    def wrapper(component, *args, **kwargs):
+        try:
+            return callback(component, *args, **kwargs)
+        finally:
+            event_loop = getattr(component, 'event_loop', None)
+            if event_loop:
+                event_loop.notify()
+    return wrapper
+
+
+class EventLoop(SimulatorInterface):
+    def __init__(self, max_wait=0.5, **kwargs):
+        """ Blocks the main loop of a component until there is work to do
+
+        Message callbacks wake up the loop with notify, work that is due at a given time
+        (e.g. the closure of a round) wakes it up with schedule.
+
+        Args:
+            max_wait (float): maximum time (in seconds) the loop waits without being woken up,
+                              so that work that is not notified is still done periodically
+            kwargs:
+                simulator (Simulator): clock of the simulation, used to convert due times to wall-clock delays
+        """
+        simulator = kwargs.get('simulator')
+        super().__init__(simulator)
+        self.logger = logging.getLogger('mrs.event.loop')
+        self.max_wait = max_wait
+
+        self._condition = threading.Condition()
+        self._notified = False
+        self._deadlines = list()
+        self._scheduled = set()
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            self.logger.debug("Adding %s", key)
+            self.__dict__[key] = value
+
+    def notify(self):
+        """ Wakes up the loop, e.g., after a message has been received """
+        with self._condition:
+            self._notified = True
+            self._condition.notify_all()
+
+    def schedule(self, due_time):
+        """ Wakes up the loop at due_time
+
+        Args:
+            due_time (datetime): time (in the simulation clock, if any) at which the loop wakes up
+        """
+        delay = (due_time - self.get_current_time()).total_seconds()
+        if self.simulator:
+            # The simulation time advances one second per step
+            delay = (delay + 1) * self.simulator.factor
+
+        with self._condition:
+            if due_time in self._scheduled:
+                return
+            self._scheduled.add(due_time)
+            heapq.heappush(self._deadlines, (time.monotonic() + max(0, delay), due_time))
+            self._condition.notify_all()
+
+    def wait(self):
+        """ Blocks until the loop is notified, a scheduled time is due or max_wait seconds elapse """
+        with self._condition:
+            if not self._notified:
+                timeout = self.max_wait
+                if self._deadlines:
+                    timeout = min(timeout, max(0, self._deadlines[0][0] - time.monotonic()))
+                self._condition.wait(timeout)
+            self._notified = False
+
+            now = time.monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, due_time = heapq.heappop(self._deadlines)
+                self._scheduled.discard(due_time)
@@ -0,0 +1,165 @@
+import json
+import logging
+import queue
+import threading
+
+from fmlib.utils.messages import MessageFactory
+
+""" In-process replacement of the middleware API, so that the CCU and the robot proxies can run in one process
+"""
+
+
+class LoopbackBus:
+    def __init__(self, serialize=True):
+        """ Routes the messages published by the loopback APIs of one process through in-memory queues
+
+        Args:
+            serialize (bool): If True, messages are encoded to and decoded from json, as the middleware does.
+                              If False, all receivers get the published dict, which they should not modify
+        """
+        self.logger = logging.getLogger('mrs.loopback.bus')
+        self.serialize = serialize
+        self.nodes = dict()
+        self.n_published = 0
+        self.n_delivered = 0
+        self.n_bytes = 0
+        self._lock = threading.Lock()
+
+    def join(self, node):
+        with self._lock:
+            self.nodes[node.node_name] = node
+
+    def leave(self, node):
+        with self._lock:
+            self.nodes.pop(node.node_name, None)
+
+    def shout(self, msg, sender, groups):
+        with self._lock:
+            receivers = [node for node in self.nodes.values()
+                         if node is not sender and set(groups).intersection(node.groups)]
+        self.deliver(msg, receivers)
+
+    def whisper(self, msg, sender, peer):
+        with self._lock:
+            receiver = self.nodes.get(peer)
+        if receiver is None:
+            self.logger.debug("Peer %s is not in the bus", peer)
+            return
+        self.deliver(msg, [receiver])
+
+    def deliver(self, msg, receivers):
+        encoded_msg = json.dumps(msg) if self.serialize else None
+        with self._lock:
+            self.n_published += 1
+            self.n_delivered += len(receivers)
+            if encoded_msg:
+                self.n_bytes += len(encoded_msg)
+
+        for receiver in receivers:
+            receiver.put(json.loads(encoded_msg) if encoded_msg else msg)
+
+    def shutdown(self):
+        for node in list(self.nodes.values()):
+            node.shutdown()
+
+    def get_stats(self):
+        return {'published': self.n_published,
+                'delivered': self.n_delivered,
+                'bytes': self.n_bytes if self.serialize else None}
+
+
+class LoopbackAPI:
+    def __init__(self, bus, middleware, **kwargs):
+        """ Exposes the methods of the middleware API used by the components
+        (create_message, publish, register_callbacks, start, run and shutdown),
+        but sends the messages through a LoopbackBus
+
+        Args:
+            bus (LoopbackBus): bus shared by all the components of the process
+            middleware (list): middleware options in the api config. The config of the first option
+                               (node name, groups, message types, publish methods and callbacks) is used
+        """
+        config = kwargs.get(middleware[0])
+        node_config = config.get('zyre_node', dict())
+
+        self.bus = bus
+        self.node_name = node_config.get('node_name')
+        self.groups = node_config.get('groups', list())
+        self.message_types = node_config.get('message_types', list())
+        self.publish_config = config.get('publish', dict())
+        self.callback_config = config.get('callbacks', list())
+
+        self.logger = logging.getLogger('mrs.loopback.%s' % self.node_name)
+        self.message_factory = MessageFactory()
+        self.callbacks = dict()
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+
+    def create_message(self, contents):
+        return self.message_factory.create_message(contents)
+
+    def publish(self, msg, groups=None, peer=None):
+        """ Whispers the msg to peer or shouts it to groups.
+        If neither is given, uses the method and groups configured for the msg type
+        """
+        if peer is None and groups is None:
+            msg_type = msg['header']['type']
+            for publish_config in self.publish_config.values():
+                if publish_config.get('msg_type') == msg_type:
+                    groups = publish_config.get('groups')
+                    break
+            else:
+                self.logger.warning("No publish method configured for msg type %s", msg_type)
+                return
+
+        if peer:
+            self.bus.whisper(msg, self, peer)
+        else:
+            self.bus.shout(msg, self, groups)
+
+    def register_callbacks(self, obj, callback_config=None):
+        """ Registers the callbacks in the api config.
+        The component of a callback is an attribute path from obj, e.g., 'auctioneer.bid_cb' or '.start_test_cb'
+        """
+        for callback in callback_config or self.callback_config:
+            component = obj
+            for name in callback.get('component').split('.'):
+                if name:
+                    component = getattr(component, name)
+            self.callbacks[callback.get('msg_type')] = component
+
+    def put(self, msg):
+        if msg['header']['type'] in self.message_types:
+            self._queue.put(msg)
+
+    def start(self):
+        self.bus.join(self)
+        self._running = True
+        self._thread = threading.Thread(target=self._receive, name=self.node_name, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """ Messages are processed by the thread started in start """
+
+    def _receive(self):
+        while self._running:
+            try:
+                msg = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            callback = self.callbacks.get(msg['header']['type'])
+            if callback is None:
+                continue
+            try:
+                callback(msg)
+            except Exception:
+                self.logger.exception("Error processing msg %s", msg['header']['type'])
+
+    def shutdown(self):
+        self._running = False
+        self.bus.leave(self)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
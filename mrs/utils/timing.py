@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    def __init__(self, enabled=False):
+        """ Accumulates the time spent in named phases of a computation
+
+        Args:
+            enabled (bool): if False, phases are not timed
+        """
+        self.enabled = enabled
+        self.durations = dict()
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def merge(self, summary):
+        """ Adds the durations of a summary (e.g. computed in another process) """
+        if not summary:
+            return
+        for name, duration in summary.items():
+            self.add(name, duration / 1000)
+
+    def reset(self):
+        self.durations = dict()
+
+    def summary(self):
+        """ Returns the time (in ms) spent in each phase or None if the timer is disabled
+        """
+        if not self.enabled:
+            return
+        return {name: round(duration * 1000, 3) for name, duration in self.durations.items()}
@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+class TravelEstimator:
+    def __init__(self, cache_size=1000, **kwargs):
+        """ Memoizes the paths and estimated durations computed by the planner.
+
+        The estimator has the same interface as the planner, so components use it as their planner.
+        get_path and get_estimated_duration are cached per (source, destination) in a bounded LRU cache,
+        the remaining planner methods are forwarded to the planner. The cache is shared by the threads of
+        the component, so it is guarded by a lock; the planner is called outside the lock.
+
+        Hits and misses are counted per lookup of a (source, destination) pair: by get_path, or by
+        get_estimated_duration when the path was not returned by the estimator
+
+        Args:
+            cache_size (int): maximum number of (source, destination) pairs in the cache
+            kwargs:
+                planner (Planner): computes paths and estimated durations between locations in the map
+        """
+        self.logger = logging.getLogger('mrs.travel.estimator')
+        self.planner = kwargs.get('planner')
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            if key == 'planner' and value is self:
+                continue
+            self.logger.debug("Adding %s", key)
+            self.__dict__[key] = value
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not defined by the estimator
+        planner = self.__dict__.get('planner')
+        if planner is None or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(planner, name)
+
+    def get_path(self, source, destination):
+        entry = self._get_entry(source, destination)
+        if entry is None:
+            path = self.planner.get_path(source, destination)
+            if path is None:
+                return path
+            entry = {'path': path}
+            self._add_entry(source, destination, entry)
+        return list(entry['path'])
+
+    def get_estimated_duration(self, path):
+        """ Returns the (mean, variance) of the time to traverse the path
+        """
+        if not path:
+            # Empty paths are not cached, the planner decides what their duration is
+            return self.planner.get_estimated_duration(path)
+
+        with self._lock:
+            entry = self._cache.get((path[0], path[-1]))
+            if entry is None or entry['path'] != path:
+                # The path was not returned by get_path, this is a lookup of its own
+                self.misses += 1
+                entry = None
+            elif 'duration' in entry:
+                return entry['duration']
+
+        duration = self.planner.get_estimated_duration(path)
+        if entry is not None:
+            with self._lock:
+                entry['duration'] = duration
+        return duration
+
+    def get_travel_duration(self, source, destination):
+        """ Returns the (mean, variance) of the time to go from source to destination
+        """
+        path = self.get_path(source, destination)
+        return self.get_estimated_duration(path)
+
+    @property
+    def hit_rate(self):
+        n_requests = self.hits + self.misses
+        if n_requests == 0:
+            return 0
+        return self.hits / n_requests
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _get_entry(self, source, destination):
+        """ Returns the cache entry of (source, destination) and counts the lookup as a hit or a miss """
+        with self._lock:
+            entry = self._cache.get((source, destination))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end((source, destination))
+            return entry
+
+    def _add_entry(self, source, destination, entry):
+        with self._lock:
+            self._cache[(source, destination)] = entry
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
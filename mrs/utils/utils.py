@@ -1,3 +1,4 @@
+import hashlib
 import logging
 
 from fmlib.utils.utils import load_file_from_module
@@ -28,3 +29,10 @@ def get_msg_fixture(msg_file):
         msg = json.load(json_msg)
 
     return msg
+
+
+def get_checksum(dict_repr):
+    """ Returns a checksum (sha1) of the canonical json representation of dict_repr
+    """
+    json_repr = json.dumps(dict_repr, sort_keys=True, default=str)
+    return hashlib.sha1(json_repr.encode()).hexdigest()